@@ -19,3 +19,11 @@ def angle_between_lines(line, line2):
     v2 = np.subtract(p4, p3)
 
     return angle_between_vectors(v1, v2)
+
+# angle_between_lines of line against every row of an (N, 4) array
+def angles_between_lines(line, lines):
+    lines = np.asarray(lines).reshape(-1, 4)
+    v1 = _unit_vector(np.subtract(line[2:4], line[0:2]))
+    v2 = np.subtract(lines[:, 2:4], lines[:, 0:2])
+    v2 = v2 / np.linalg.norm(v2, axis=1)[:, np.newaxis]
+    return np.arccos(np.clip(np.dot(v2, v1), -1.0, 1.0))
@@ -0,0 +1,81 @@
+"""Runs clock detection over many images on a process pool"""
+import glob
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+from results import serializer
+from worker import detect
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+MANIFEST_EXTENSIONS = (".txt", ".json", ".jsonl")
+
+def _isimage(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+def _readmanifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as manifest:
+        if path.lower().endswith(".json"):
+            entries = json.load(manifest)
+            # testcases.json style manifests list their images under cases
+            if isinstance(entries, dict):
+                entries = entries.get("cases", [])
+        else:
+            entries = [line.strip() for line in manifest]
+
+    files = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry = entry.get("filename", entry.get("file"))
+        if entry and not entry.startswith("#"):
+            files.append(os.path.join(base, entry))
+    return files
+
+# accepts a directory, a glob pattern or a manifest file (one path per line, a json list or a json object with cases)
+def listimages(spec):
+    if os.path.isdir(spec):
+        return [os.path.join(spec, name) for name in sorted(os.listdir(spec)) if _isimage(name)]
+    if os.path.isfile(spec):
+        if spec.lower().endswith(MANIFEST_EXTENSIONS):
+            return _readmanifest(spec)
+        return [spec]
+    return sorted(path for path in glob.glob(spec, recursive=True) if _isimage(path))
+
+# options of the worker process, handed over once when it starts so its caches and debug sink
+# live across the images it processes
+_options = None
+
+def _initworker(options):
+    global _options
+    _options = options
+    # pending stage images are written before the worker exits
+    debug = (options or {}).get("debug")
+    if debug:
+        multiprocessing.util.Finalize(debug, debug.close, exitpriority=10)
+
+def _processfile(filename):
+    try:
+        return (filename, detect({"filename": filename}, _options), None)
+    except Exception as e:
+        return (filename, [], str(e))
+
+# writes the results of every image as soon as it completes
+def runbatch(spec, workers=None, options=None, out=sys.stdout, fmt="json"):
+    files = listimages(spec)
+    if not files:
+        raise ValueError("no images found for %s" % spec)
+
+    workers = min(workers or multiprocessing.cpu_count(), len(files))
+    writer = serializer(out, fmt)
+    pool = multiprocessing.Pool(workers, initializer=_initworker, initargs=(options,))
+    try:
+        for filename, results, error in pool.imap_unordered(_processfile, files):
+            writer.write(results, filename, error)
+        # workers exit on their own, flushing what they still hold (see _initworker)
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+        pool.join()
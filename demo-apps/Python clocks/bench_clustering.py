@@ -0,0 +1,218 @@
+"""Scaling benchmark of the line clustering stages against the number of Hough segments"""
+import argparse
+import copy
+import math
+import random
+import time
+import numpy as np
+from angles import angle_between_lines
+from clockhandler import clockhandler
+
+# the scalar helpers of the previous clockhandler, only the reference implementations use them
+def _calcclosestpoint(center, line):
+    v1 = (center - line[0], center - line[1])
+    v2 = (center - line[2], center - line[3])
+
+    dist = math.hypot(v1[0], v1[1])
+    dist2 = math.hypot(v2[0], v2[1])
+
+    if dist < dist2:
+        return [line[0], line[1]]
+    else:
+        return [line[2], line[3]]
+
+def _pointdistancetoline(point, line):
+    # return (ditance betewen the line and the point, point in the line closer to the point provided as param)
+    vec = (line[0] - line[2], line[1] - line[3])
+    if vec[0] != 0:
+        m = vec[1] / vec[0]
+        b = line[1] - m*line[0]
+        b2 = point[1] + m*point[0]
+        result = np.linalg.solve([[-m, 1], [m, 1]], [b, b2])
+        vec2 = [result[0] - point[0], result[1] - point[1]]
+    else:
+        result = [line[1], point[1]]
+        vec2 = [line[1], point[1]]
+
+    return (math.hypot(vec2[0], vec2[1]), result)
+
+def _pointdistancetosegment(point, segment):
+    dist, point2 = _pointdistancetoline(point, segment)
+
+    x1, y1, x2, y2 = segment
+
+    v1 = (point[0] - x1, point[1] - y1)
+    v2 = (point[0] - x2, point[1] - y2)
+
+    size_v1 = math.hypot(v1[0], v1[1])
+    size_v2 = math.hypot(v2[0], v2[1])
+
+    pointsx = [x1, x2, point2[0]]
+    pointsy = [y1, y2, point2[1]]
+
+    dists = [size_v1, size_v2]
+
+    if x1 != x2:
+        if max(pointsx) != point2[0] and min(pointsx) != point2[0]:
+            dists.append(dist)
+    else:
+        if max(pointsy) != point2[1] and min(pointsy) != point2[1]:
+            dists.append(dist)
+
+    return min(dists)
+
+def _calcdistance(line1, line2, radius):
+    p1 = _calcclosestpoint(radius, line1)
+    p2 = _calcclosestpoint(radius, line2)
+
+    p = _calcclosestpoint(radius, p1 + p2)
+
+    if set(p2) == set(p):
+        return _pointdistancetoline(p2, line1)[0]
+    else:
+        return _pointdistancetoline(p1, line2)[0]
+
+# the greedy pairwise loops the indexed clustering replaced, used as reference
+def _referencecolinear(lines, center):
+    threshold = math.pi * 2.5 / 180
+    colinearlines = []
+    for line1 in lines:
+        added = False
+        for cluster in colinearlines:
+            for line2 in cluster:
+                points = [[line1[0], line1[1]], [line1[2], line1[3]]]
+                points += [[line2[0], line2[1]], [line2[2], line2[3]]]
+                points.sort(key=lambda x: x[0])
+
+                mab = math.atan2(points[0][1] - points[1][1], points[0][0] - points[1][0])
+                mac = math.atan2(points[0][1] - points[2][1], points[0][0] - points[2][0])
+                mad = math.atan2(points[0][1] - points[3][1], points[0][0] - points[3][0])
+                diff = [abs(mab - mac), abs(mab - mad), abs(mac - mad)]
+                try:
+                    mindist1 = _pointdistancetosegment([line2[0], line2[1]], line1)
+                    mindist2 = _pointdistancetosegment([line2[2], line2[3]], line1)
+                except np.linalg.linalg.LinAlgError:
+                    continue
+
+                if max(diff) < threshold and min(mindist2, mindist1) < center * 0.05:
+                    cluster.append(line1)
+                    added = True
+                    break
+            if added:
+                break
+        if not added:
+            colinearlines.append([line1])
+
+    # one line per group, from its point farthest from the center to the closest one
+    res = []
+    for cluster in colinearlines:
+        proclines = []
+        for line in cluster:
+            proclines.append([[line[0], line[1]], math.hypot(line[0] - center, line[1] - center)])
+            proclines.append([[line[2], line[3]], math.hypot(line[2] - center, line[3] - center)])
+        res.append(max(proclines, key=lambda x: x[1])[0] + min(proclines, key=lambda x: x[1])[0])
+    return res
+
+def _referenceclusters(lines):
+    threshold = math.pi * 10/ 180
+    clusters = [[lines[0]]]
+    for line in lines[1:]:
+        added = False
+        for cluster in clusters:
+            for line2 in cluster:
+                rads = angle_between_lines(line, line2)
+                if rads < threshold and rads > -threshold:
+                    cluster.append(line)
+                    added = True
+                    break
+            if added:
+                break
+        if not added:
+            clusters.append([line])
+    return clusters
+
+def _referencemaxdistance(clusters, radius):
+    res = []
+    for cluster in clusters:
+        dist = [0]
+        for line1 in cluster:
+            for line2 in cluster:
+                try:
+                    dist.append(_calcdistance(line1, line2, radius))
+                except np.linalg.linalg.LinAlgError:
+                    continue
+        res.append(max(dist))
+    return res
+
+# radial segments around the center plus random clutter, like a busy clock face
+def makesegments(count, radius, rng):
+    segments = []
+    for i in range(count):
+        if i % 4 == 3:
+            segments.append(np.array([rng.randrange(2 * radius) for _ in range(4)], dtype=np.int32))
+            continue
+        angle = rng.uniform(0, 2 * math.pi)
+        inner = rng.uniform(0, 0.3 * radius)
+        outer = rng.uniform(0.4 * radius, radius)
+        segments.append(np.array([radius + outer * math.cos(angle), radius + outer * math.sin(angle),
+                                  radius + inner * math.cos(angle), radius + inner * math.sin(angle)], dtype=np.int32))
+    return segments
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def _ids(clusters):
+    return [[list(map(int, line)) for line in cluster] for cluster in clusters]
+
+# lines of every cluster from the labels of _clusterlines
+def _groups(lines, labels):
+    return [lines[labels == label] for label in range(labels.max() + 1 if len(labels) else 0)]
+
+def run(counts, radius, reference, seed):
+    rng = random.Random(seed)
+    ch = clockhandler(np.zeros((2 * radius, 2 * radius), dtype=np.uint8), test=True)
+    rows = []
+    for count in counts:
+        segments = makesegments(count, radius, rng)
+
+        colinear, tcol = _timed(ch._calccolinearlines, copy.deepcopy(segments), radius)
+        filtered = ch._filterlines(colinear, radius)
+        labels, tclu = _timed(ch._clusterlines, filtered)
+        distances, tmax = _timed(ch._calcmaxdistance, filtered, labels, radius)
+        row = {"segments": count, "colinear": tcol, "clusters": tclu, "maxdistance": tmax}
+
+        if reference:
+            refcol, row["ref_colinear"] = _timed(_referencecolinear, copy.deepcopy(segments), radius)
+            refclusters, row["ref_clusters"] = _timed(_referenceclusters, list(filtered)) if len(filtered) else ([], 0)
+            refdist, row["ref_maxdistance"] = _timed(_referencemaxdistance, refclusters, radius)
+            row["equal"] = (np.array_equal(np.array(refcol).reshape(-1, 4), colinear) and _ids(refclusters) == _ids(_groups(filtered, labels))
+                            and np.allclose(refdist, distances))
+        rows.append(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Clustering runtime against segment count.")
+    parser.add_argument("--counts", help="comma separated segment counts. Default: 25,50,100,200,400,800", default="25,50,100,200,400,800")
+    parser.add_argument("--radius","-r", help="clock radius in pixels. Default: 200", type=int, default=200)
+    parser.add_argument("--reference", help="also time the previous greedy implementation and check the outputs match.", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = run([int(count) for count in args.counts.split(",")], args.radius, args.reference, args.seed)
+
+    header = '{:>9} {:>14} {:>14} {:>14}'.format("Segments", "Colinear [ms]", "Clusters [ms]", "MaxDist [ms]")
+    if args.reference:
+        header += ' {:>14} {:>14} {:>14} {:>6}'.format("Ref col [ms]", "Ref clu [ms]", "Ref max [ms]", "Equal")
+    print(header)
+    print("-"*len(header))
+    for row in rows:
+        line = '{:9} {:14.2f} {:14.2f} {:14.2f}'.format(row["segments"], row["colinear"] * 1000, row["clusters"] * 1000, row["maxdistance"] * 1000)
+        if args.reference:
+            line += ' {:14.2f} {:14.2f} {:14.2f} {:>6}'.format(row["ref_colinear"] * 1000, row["ref_clusters"] * 1000,
+                                                              row["ref_maxdistance"] * 1000, str(row["equal"]))
+        print(line)
+
+if __name__ == "__main__":
+    main()
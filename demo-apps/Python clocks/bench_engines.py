@@ -0,0 +1,82 @@
+"""Side by side accuracy and latency of the hand reading engines on the test cases"""
+import argparse
+import time
+import cv2
+import numpy as np
+from cases import loadcases, isaccurate, DEFAULT_MANIFEST
+from clockhandler import clockhandler, ENGINES, CENTER_X, CENTER_Y, RADIUS
+from results import STATUS_OK, formattime
+from synth import drawclock
+
+# a hand pointing at 3 o'clock lies across the first and last rows of the polar unwrap
+SEAM_TIMES = ((3, 10, 20), (7, 35, 15), (9, 40, 15))
+
+# rendered clocks with one hand on the seam of the polar engine, read along the manifest cases
+def _seamcases():
+    cases = []
+    for index, time in enumerate(SEAM_TIMES):
+        img = np.full((400, 400), 120, dtype=np.uint8)
+        drawclock(img, (200, 200), 150, time, thickness=4)
+        cases.append({"file": "seam_%d" % index, "image": img, "h": time[0], "m": time[1], "s": time[2]})
+    return cases
+
+# crops of every circle candidate fully inside the image, as getwatchcircle cuts them
+def _crops(img):
+    ch = clockhandler(img, test=True, workers=1)
+    circles = ch._findcircles(ch._img, 150)
+    if circles is None:
+        return []
+    crops = []
+    for i in np.uint16(np.around(circles))[0].astype(np.int32):
+        if (i[CENTER_X] - i[RADIUS] < 0 or i[CENTER_Y] - i[RADIUS] < 0
+                or i[CENTER_X] + i[RADIUS] > img.shape[1] or i[CENTER_Y] + i[RADIUS] > img.shape[0]):
+            continue
+        crops.append((ch._img[i[CENTER_Y] - i[RADIUS]:i[CENTER_Y] + i[RADIUS], i[CENTER_X] - i[RADIUS]:i[CENTER_X] + i[RADIUS]], i[RADIUS]))
+    return crops
+
+# fastest time to read the hands of every crop, and the first time read
+def _run(crops, engine, repeat):
+    ch = clockhandler(np.zeros((1, 1), dtype=np.uint8), test=True, workers=1, engine=engine)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [ch._processcircle(crop, radius) for crop, radius in crops]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    times = [result.time for result in results if result.status == STATUS_OK]
+    return best, times[0] if times else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Hand reading engine benchmark.")
+    parser.add_argument("--manifest","-m", help="test case manifest. Default: testcases.json", default=DEFAULT_MANIFEST)
+    parser.add_argument("--repeat","-n", help="runs per measurement, the fastest is kept. Default: 10", type=int, default=10)
+    parser.add_argument("--no-seam", help="leave out the rendered clocks with a hand at 3 o'clock.", action="store_true")
+    args = parser.parse_args()
+
+    cases, tolerance, missing = loadcases(args.manifest)
+    if not args.no_seam:
+        cases += _seamcases()
+    if missing:
+        print("Missing test images: {}".format(", ".join(missing)))
+
+    totals = dict((engine, {"time": 0, "accurate": 0}) for engine in ENGINES)
+    print('{:12} {:>8}'.format("Case", "Expected") + "".join(' {:>10} {:>10}'.format(engine, "Time [ms]") for engine in ENGINES))
+    print("-"*(21 + 22 * len(ENGINES)))
+    for case in cases:
+        crops = _crops(case["image"] if "image" in case else cv2.imread(case["path"], 0))
+        line = '{:12} {:>8}'.format(case["file"], formattime((case["h"], case["m"], case["s"])))
+        for engine in ENGINES:
+            elapsed, clock = _run(crops, engine, args.repeat)
+            totals[engine]["time"] += elapsed
+            totals[engine]["accurate"] += isaccurate(case, clock, tolerance)
+            line += ' {:>10} {:10.2f}'.format(formattime(clock) if clock else "-", elapsed * 1000)
+        print(line)
+
+    print("-"*(21 + 22 * len(ENGINES)))
+    line = '{:12} {:>8}'.format("Total", "")
+    for engine in ENGINES:
+        line += ' {:>10} {:10.2f}'.format("{}/{}".format(totals[engine]["accurate"], len(cases)), totals[engine]["time"] * 1000)
+    print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Peak memory of one detection with the grayscale ROI path against the previous BGR copies"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+import cv2
+import numpy as np
+from cases import loadcases, DEFAULT_MANIFEST
+from clockhandler import clockhandler
+
+VARIANTS = ("lean", "legacy")
+
+# the allocations of the previous path: a full BGR copy of the image, BGR crops copied out of it,
+# full size mask, background and result per candidate, and a gray copy again for Canny
+class _legacyhandler(clockhandler):
+    def getwatchcircle(self):
+        self._cimg = cv2.cvtColor(self._img, cv2.COLOR_GRAY2BGR)
+        return clockhandler.getwatchcircle(self)
+
+    def _processcrop(self, circle, radius, center):
+        # same pixels and size as the copy sliced out of the BGR image
+        if circle is not None:
+            circle = cv2.cvtColor(circle, cv2.COLOR_GRAY2BGR)
+        return clockhandler._processcrop(self, circle, radius, center)
+
+    def _getcircleimg(self, img, radius):
+        size = radius * 2
+        mask = np.full((size, size), 255, dtype=np.uint8)
+        cv2.circle(mask, (radius, radius), radius, (0, 0, 0), -1)
+        background = np.full(img.shape, 255, dtype=np.uint8)
+        background = cv2.bitwise_or(background, background, mask=mask)
+        return cv2.bitwise_or(img, background)
+
+    def _calcedges(self, circle):
+        gray = cv2.cvtColor(circle, cv2.COLOR_BGR2GRAY) if circle.ndim == 3 else circle.copy()
+        return cv2.Canny(gray, 70, 110)
+
+def _maxrss():
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def _load(path, size):
+    img = cv2.imread(path, 0)
+    if size:
+        scale = size / max(img.shape)
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    return img
+
+# runs in a fresh process so the peak RSS only holds this one detection
+def _child(variant, path, size):
+    img = _load(path, size)
+    handler = _legacyhandler if variant == "legacy" else clockhandler
+    # a first run on a small image loads OpenCV's code and buffers before the baseline is taken
+    handler(cv2.resize(img, (64, 64)), test=True, workers=1).getwatchcircle()
+    baseline = _maxrss()
+    tracemalloc.start()
+    handler(img, test=True, workers=1).getwatchcircle()
+    traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(json.dumps({"rss": _maxrss() - baseline, "traced": traced}))
+
+def measure(variant, path, size):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", variant, "--filename", path,
+                                      "--sizes", str(size)], universal_newlines=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory per image, grayscale views against the previous BGR copies.")
+    parser.add_argument("--manifest","-m", help="test case manifest. Default: testcases.json", default=DEFAULT_MANIFEST)
+    parser.add_argument("--sizes", help="comma separated long side of the images, 0 keeps the original. Default: 0,2000,4000", default="0,2000,4000")
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--filename", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.filename, int(args.sizes))
+        return
+
+    cases, _tolerance, missing = loadcases(args.manifest)
+    if missing:
+        print("Missing test images: {}".format(", ".join(missing)))
+
+    print('{:12} {:>6} {:>16} {:>16} {:>16} {:>16}'.format("Case", "Size", "legacy RSS [MB]", "lean RSS [MB]",
+                                                          "legacy heap [MB]", "lean heap [MB]"))
+    print("-"*88)
+    for case in cases:
+        for size in [int(size) for size in args.sizes.split(",")]:
+            rows = dict((variant, measure(variant, case["path"], size)) for variant in VARIANTS)
+            print('{:12} {:>6} {:16.2f} {:16.2f} {:16.2f} {:16.2f}'.format(case["file"], size or "orig",
+                  rows["legacy"]["rss"] / 2 ** 20, rows["lean"]["rss"] / 2 ** 20,
+                  rows["legacy"]["traced"] / 2 ** 20, rows["lean"]["traced"] / 2 ** 20))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compares full resolution circle search with the coarse-to-fine pyramid on upscaled test cases"""
+import argparse
+import math
+import time
+import cv2
+from cases import loadcases, isaccurate, DEFAULT_MANIFEST
+from clockhandler import clockhandler
+from results import STATUS_OK
+
+def _firstclock(results):
+    for result in results:
+        if result.status == STATUS_OK:
+            return result
+    return None
+
+def _run(img, factor, repeat):
+    best = None
+    for _ in range(repeat):
+        ch = clockhandler(img, test=True, workers=1, pyramid=factor)
+        start = time.perf_counter()
+        results = ch.getwatchcircle()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, _firstclock(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pyramid circle search benchmark.")
+    parser.add_argument("--manifest","-m", help="test case manifest. Default: testcases.json", default=DEFAULT_MANIFEST)
+    parser.add_argument("--sizes", help="comma separated long side of the images, 0 keeps the original. Default: 0,2000,4000", default="0,2000,4000")
+    parser.add_argument("--factors", help="comma separated pyramid factors. Default: 1,2,4,8", default="1,2,4,8")
+    parser.add_argument("--repeat","-n", help="runs per measurement, the fastest is kept. Default: 3", type=int, default=3)
+    args = parser.parse_args()
+
+    cases, tolerance, missing = loadcases(args.manifest)
+    if missing:
+        print("Missing test images: {}".format(", ".join(missing)))
+    factors = [float(factor) for factor in args.factors.split(",")]
+
+    print('{:>6} {:>7} {:>10} {:>8} {:>9} {:>11} {:>11}'.format("Size", "Factor", "Time [ms]", "Speedup", "Accurate", "Center [px]", "Radius [px]"))
+    print("-"*68)
+    for size in [int(size) for size in args.sizes.split(",")]:
+        rows = dict((factor, {"time": 0, "accurate": 0, "center": [], "radius": []}) for factor in factors)
+        for case in cases:
+            img = cv2.imread(case["path"], 0)
+            if size:
+                scale = size / max(img.shape)
+                img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+            reference = None
+            for factor in factors:
+                elapsed, clock = _run(img, factor, args.repeat)
+                row = rows[factor]
+                row["time"] += elapsed
+                row["accurate"] += isaccurate(case, clock.time if clock else None, tolerance)
+                if factor == factors[0]:
+                    reference = clock
+                # position error against the first factor, the full resolution search when it is 1
+                if clock is not None and reference is not None:
+                    row["center"].append(math.hypot(clock.center[0] - reference.center[0], clock.center[1] - reference.center[1]))
+                    row["radius"].append(abs(clock.radius - reference.radius))
+
+        base = rows[factors[0]]["time"]
+        for factor in factors:
+            row = rows[factor]
+            center = sum(row["center"]) / len(row["center"]) if row["center"] else float("nan")
+            radius = sum(row["radius"]) / len(row["radius"]) if row["radius"] else float("nan")
+            print('{:>6} {:7.1f} {:10.1f} {:8.2f} {:>9} {:11.1f} {:11.1f}'.format(size or "orig", factor, row["time"] * 1000,
+                  base / row["time"] if row["time"] else float("nan"), "{}/{}".format(row["accurate"], len(cases)), center, radius))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measures the cold-start cost of a headless interface.py -f run"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULES = ["numpy", "cv2", "angles", "drawer", "clockhandler", "squares", "webcam"]
+
+# what webcam.py used to do at import time on every run
+CAMERA_PROBE = "import time, cv2\nt = time.time()\ncv2.VideoCapture(0)\nprint(time.time() - t)"
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+# parses "import time: self [us] | cumulative | imported package" lines
+def _importtimes(stderr):
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2].strip()
+        if name in MODULES:
+            times[name] = cumulative
+    return times
+
+def timecoldstart(image, runs):
+    walls = []
+    imports = {}
+    for _ in range(runs):
+        start = time.time()
+        proc = subprocess.run([sys.executable, "-X", "importtime", os.path.join(HERE, "interface.py"), "-f", image],
+                              cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        walls.append(time.time() - start)
+        for name, value in _importtimes(proc.stderr).items():
+            imports.setdefault(name, []).append(value)
+    return walls, imports
+
+def timecameraprobe(runs):
+    probes = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", CAMERA_PROBE],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        probes.append(float(proc.stdout.strip() or 0))
+    return probes
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for headless interface.py runs.")
+    parser.add_argument("--filename","-f", help="image passed to interface.py -f. Default: 7.jpg", default=os.path.join(HERE, "7.jpg"))
+    parser.add_argument("--runs","-n", help="number of cold starts to time. Default: 5", type=int, default=5)
+    args = parser.parse_args()
+
+    walls, imports = timecoldstart(args.filename, args.runs)
+    probes = timecameraprobe(args.runs)
+
+    print("Cold start of interface.py -f over {} runs".format(args.runs))
+    print("-"*49)
+    print('{:24} {:>12}'.format("Module", "import [ms]"))
+    for name in MODULES:
+        if name in imports:
+            print('{:24} {:12.1f}'.format(name, _median(imports[name]) / 1000))
+        else:
+            print('{:24} {:>12}'.format(name, "not imported"))
+    print("-"*49)
+    print('{:24} {:12.1f}'.format("Total wall time [ms]", _median(walls) * 1000))
+    print('{:24} {:12.1f}'.format("Camera probe saved [ms]", _median(probes) * 1000))
+
+if __name__ == "__main__":
+    main()
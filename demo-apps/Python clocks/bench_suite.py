@@ -0,0 +1,149 @@
+"""Accuracy and per-stage latency of the circle pipeline on the test cases, saved as json to compare runs"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import cv2
+import numpy as np
+from cases import loadcases, isaccurate, DEFAULT_MANIFEST
+from clockhandler import clockhandler, ENGINES, ENGINE_HOUGH
+from instrument import metrics
+from interface import check_threshold
+from preprocess import imagecontext
+from results import STATUS_OK, formattime
+
+# stages of instrument.metrics in pipeline order, the circle search ones, then the ones of every candidate
+STAGE_NAMES = ["blur", "downscale", "houghcircles", "pyramidrefine", "autothreshold", "mask", "canny", "houghlines",
+               "colinear", "filter", "clustering", "maxdistance", "merge", "polar", "timecalc", "total"]
+
+def _firsttime(results):
+    for result in results:
+        if result.status == STATUS_OK:
+            return result.time
+    return None
+
+# one detection on a fresh context, returns (stage timings in seconds, time read)
+def runcase(img, options):
+    collected = metrics()
+    start = time.perf_counter()
+    results = clockhandler(imagecontext(img), test=True, workers=1, metrics=collected, **options).getwatchcircle()
+    timings = dict(collected.timers)
+    timings["total"] = time.perf_counter() - start
+    return timings, _firsttime(results)
+
+def _percentiles(values):
+    values = np.array(values) * 1000
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)), "mean": float(values.mean())}
+
+# stages no run went through, e.g. the pyramid ones without --pyramid, are left out
+def _summary(runs):
+    return dict((name, _percentiles([run.get(name, 0.0) for run in runs])) for name in STAGE_NAMES
+                if any(name in run for run in runs))
+
+def _commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runsuite(manifest, repeat, options):
+    cases, tolerance, missing = loadcases(manifest)
+    report = {"commit": _commit(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "opencv": cv2.__version__, "options": options, "repeat": repeat, "tolerance": tolerance,
+              "missing": missing, "cases": []}
+    allruns = []
+    accurate = 0
+    for case in cases:
+        img = cv2.imread(case["path"], 0)
+        if img is None:
+            report["missing"].append(case["file"])
+            continue
+        # the first run warms up OpenCV and is not timed
+        runcase(img, options)
+        runs = []
+        for _ in range(repeat):
+            timings, observed = runcase(img, options)
+            runs.append(timings)
+        allruns += runs
+        ok = isaccurate(case, observed, tolerance)
+        accurate += ok
+        report["cases"].append({"file": case["file"], "expected": [case["h"], case["m"], case["s"]],
+                                "observed": list(observed) if observed else None, "accurate": ok,
+                                "stages": _summary(runs)})
+
+    report["accuracy"] = {"accurate": accurate, "total": len(report["cases"])}
+    report["stages"] = _summary(allruns) if allruns else {}
+    return report
+
+def printreport(report):
+    if report["missing"]:
+        print("Missing test images: {}".format(", ".join(report["missing"])))
+    print("-"*49)
+    for case in report["cases"]:
+        observed = formattime(case["observed"]) if case["observed"] else "no clock read"
+        print('{:16} expected {} observed {:13} {:>8} {:8.1f} ms'.format(case["file"], formattime(case["expected"]), observed,
+              "ok" if case["accurate"] else "FAILED", case["stages"]["total"]["p50"]))
+    print("-"*49)
+    print('{:16} {:>10} {:>10} {:>10}'.format("Stage", "p50 [ms]", "p95 [ms]", "mean [ms]"))
+    for name in STAGE_NAMES:
+        if name in report["stages"]:
+            stage = report["stages"][name]
+            print('{:16} {:10.3f} {:10.3f} {:10.3f}'.format(name, stage["p50"], stage["p95"], stage["mean"]))
+    print("-"*49)
+    print("Accurate predictions using tolerance ({},{},{}): {}/{}".format(report["tolerance"]["h"], report["tolerance"]["m"],
+          report["tolerance"]["s"], report["accuracy"]["accurate"], report["accuracy"]["total"]))
+
+# prints the p50 of every stage against a baseline report, returns the stages slower than allowed
+def compare(report, baseline, maxregression):
+    print("-"*49)
+    print("Against {} ({})".format(baseline.get("commit") or "baseline", baseline.get("date")))
+    print('{:16} {:>10} {:>10} {:>10}'.format("Stage", "base [ms]", "p50 [ms]", "change"))
+    regressions = []
+    for name in STAGE_NAMES:
+        if name not in report["stages"] or name not in baseline.get("stages", {}):
+            continue
+        before, after = baseline["stages"][name]["p50"], report["stages"][name]["p50"]
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ""
+        if change > maxregression:
+            regressions.append(name)
+            flag = " slower"
+        print('{:16} {:10.3f} {:10.3f} {:9.1f}%{}'.format(name, before, after, change, flag))
+    if report["accuracy"]["accurate"] < baseline.get("accuracy", {}).get("accurate", 0):
+        regressions.append("accuracy")
+        print("Accuracy dropped from {} to {}".format(baseline["accuracy"]["accurate"], report["accuracy"]["accurate"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and per-stage latency benchmark.")
+    parser.add_argument("--manifest","-m", help="test case manifest. Default: testcases.json", default=DEFAULT_MANIFEST)
+    parser.add_argument("--repeat","-n", help="timed runs per case. Default: 20", type=int, default=20)
+    parser.add_argument("--threshold","-t", help="circle detection threshold, or auto. Default: 150", type=check_threshold, default=150)
+    parser.add_argument("--pyramid","-p", help="pyramid factor of the circle search. Default: 1", type=float, default=1)
+    parser.add_argument("--engine","-e", help="hand reader. Default: hough", choices=ENGINES, default=ENGINE_HOUGH)
+    parser.add_argument("--output","-o", help="write the report as json to this file.")
+    parser.add_argument("--compare","-c", help="json report of an earlier run to compare with. Exits with 1 on regressions.")
+    parser.add_argument("--max-regression", help="allowed p50 slowdown of a stage against --compare, in percent. Default: 20", type=float, default=20)
+    args = parser.parse_args()
+
+    options = {"threshold": args.threshold, "pyramid": args.pyramid, "engine": args.engine}
+    report = runsuite(args.manifest, args.repeat, options)
+    printreport(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("Regressions: {}".format(", ".join(regressions)))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Detection results cached by image content and detection parameters"""
+import collections
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from results import clockresult
+
+DEFAULT_CACHE_SIZE = 256
+
+# least recently used results in memory, optionally backed by one json file per key in directory.
+# Results go in and out as copies, callers may change the ones they get
+class resultcache:
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, directory=None):
+        self._maxsize = maxsize
+        self._directory = directory
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.diskhits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # worker processes get the same settings and an empty memory cache
+    def __getstate__(self):
+        return {"maxsize": self._maxsize, "directory": self._directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"], state["directory"])
+
+    # hash of the pixels, shape and parameters; arrays are hashed in place, without a copy.
+    # sha256 runs on the CPU hash instructions where there are some, faster than blake2 or md5
+    def key(self, img, **params):
+        img = np.ascontiguousarray(img)
+        digest = hashlib.sha256()
+        digest.update(("%s %s %s" % (img.shape, img.dtype, json.dumps(params, sort_keys=True))).encode("utf-8"))
+        digest.update(memoryview(img).cast("B"))
+        return digest.hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + ".json")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return [clockresult.fromdict(data) for data in entry]
+
+        if self._directory is not None and os.path.isfile(self._path(key)):
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+            except ValueError:
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+                with self._lock:
+                    self.diskhits += 1
+                return [clockresult.fromdict(data) for data in entry]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, results):
+        entry = [result.todict() for result in results]
+        self._remember(key, entry)
+        if self._directory is not None:
+            # written aside then renamed so readers never see half a file
+            temp = self._path(key) + ".%d.tmp" % os.getpid()
+            with open(temp, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp, self._path(key))
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self._maxsize, "hits": self.hits,
+                    "diskhits": self.diskhits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,30 @@
+"""Labelled clock images listed in a json manifest"""
+import json
+import os
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testcases.json")
+DEFAULT_TOLERANCE = {"h": 1, "m": 5, "s": 5}
+
+# returns (cases whose image exists, tolerance, files that are missing); paths are relative to the manifest
+def loadcases(manifest=DEFAULT_MANIFEST):
+    with open(manifest) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"cases": data}
+
+    base = os.path.dirname(os.path.abspath(manifest))
+    cases = []
+    missing = []
+    for case in data["cases"]:
+        case = dict(case, path=os.path.join(base, case["file"]))
+        if os.path.isfile(case["path"]):
+            cases.append(case)
+        else:
+            missing.append(case["file"])
+    return cases, data.get("tolerance", DEFAULT_TOLERANCE), missing
+
+def isaccurate(case, time, tolerance):
+    if time is None:
+        return False
+    h, m, s = time
+    return abs(case["h"] - h) < tolerance["h"] and abs(case["m"] - m) < tolerance["m"] and abs(case["s"] - s) < tolerance["s"]
@@ -1,258 +1,226 @@
 """Contains the functions required to process a clock image"""
 from __future__ import division
+import functools
 import math
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 import drawer
-from webcam import getWebcamImage
-from angles import angle_between_lines
+import geometry
+import polar
+from results import clockresult, HANDS, STATUS_OK, STATUS_NO_LINES, STATUS_TOO_MANY_LINES, STATUS_OUT_OF_BOUNDS, formattime
+from angles import angles_between_lines
+from debugsink import getdebug
+from instrument import getmetrics
+from preprocess import getcontext
 
 CENTER_X = 0
 CENTER_Y = 1
 RADIUS = 2
+# the pyramid never shrinks the short side of an image below this
+PYRAMID_MIN_SIZE = 240
+# hand readers: Hough line segments, or the polar unwrap of polar.py
+ENGINE_HOUGH = "hough"
+ENGINE_POLAR = "polar"
+ENGINES = (ENGINE_HOUGH, ENGINE_POLAR)
+# radii kept by the per-process caches below. Tracking and batch runs see the same radii again and again
+MASK_CACHE_SIZE = 32
+# threshold="auto" runs HoughCircles once at AUTO_PARAM2 and keeps the candidates whose rim lies on
+# edges at the highest of AUTO_LEVELS any of them reaches, instead of retrying with lower thresholds
+THRESHOLD_AUTO = "auto"
+AUTO_PARAM2 = 60
+AUTO_LEVELS = (0.9, 0.8, 0.7, 0.6, 0.5)
+AUTO_SAMPLES = 64
+
+# white outside the circle, black inside. Shared between threads, so read-only
+@functools.lru_cache(maxsize=MASK_CACHE_SIZE)
+def circlemask(radius):
+    size = radius * 2
+    mask = np.full((size, size), 255, dtype=np.uint8)
+    cv2.circle(mask, (radius, radius), radius, (0, 0, 0), -1)
+    mask.flags.writeable = False
+    return mask
+
+# (minlinelength, maxlinegap, threshold) of HoughLinesP on a crop whose long side is size
+@functools.lru_cache(maxsize=MASK_CACHE_SIZE)
+def houghparams(size):
+    return (int(round(size * 0.15)), int(round(size * 0.015)), int(round(size * 0.15)))
+
 class clockhandler:
-    def __init__(self, img, debug=False, test=False, threshold=150):
+    # workers caps the threads processing circle candidates, None uses one per core
+    # pyramid > 1 searches circles on an image that many times smaller, then refines them at full size
+    # img is a grayscale image or the imagecontext of one, shared with the other detectors
+    # engine picks the hand reader, one of ENGINES
+    # metrics is an instrument.metrics filled with stage timers and counts, None disables it
+    # debug True shows the stages in windows, a debugsink sink collects them
+    # threshold is the HoughCircles accumulator threshold, or THRESHOLD_AUTO
+    def __init__(self, img, debug=False, test=False, threshold=150, workers=None, pyramid=1, engine=ENGINE_HOUGH, metrics=None):
+        if engine not in ENGINES:
+            raise ValueError("unknown hand engine %s" % engine)
         self._test = test
-        self._debug = debug
-        self._img = cv2.medianBlur(img, 3)
-        self._cimg = cv2.cvtColor(self._img, cv2.COLOR_GRAY2BGR)
+        self._engine = engine
+        self._workers = workers
+        self._pyramid = pyramid
+        self._debug = getdebug(debug)
+        self._context = getcontext(img)
         self._circleThreshold = threshold
-
-    # isolate clock face from the image
+        # rim support cutoff picked by the auto threshold, reported with the results
+        self.autolevel = None
+        self._metrics = getmetrics(metrics)
+        self._buffers = threading.local()
+
+    # the blurred image is only computed once a circle search needs it
+    @property
+    def _img(self):
+        return self._context.median()
+
+    # color copy for the debug drawings
+    def _debugcopy(self, img):
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img.copy()
+
+    # output of _getcircleimg, reused by the candidates processed on the same thread
+    def _circlebuffer(self, shape):
+        buffer = getattr(self._buffers, "circle", None)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self._buffers.circle = buffer
+        return buffer
+
+    # isolate clock face from the image: outside the circle turns white. The result is only valid until
+    # the next call on this thread
     def _getcircleimg(self, img, radius):
-        size = radius * 2
-
-        mask = np.full((size, size), 255, dtype=np.uint8)
-        cv2.circle(mask, (radius, radius), radius, (0, 0, 0), -1)
-
-        background = np.full(img.shape, 255, dtype=np.uint8)
-        background = cv2.bitwise_or(background, background, mask=mask)
-
-        return cv2.bitwise_or(img, background)
+        mask = circlemask(int(radius))[:img.shape[0], :img.shape[1]]
+        if img.ndim == 3:
+            mask = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
+        return cv2.bitwise_or(img, mask, dst=self._circlebuffer(img.shape))
 
-    #cluster lines that similar slopes
+    #cluster lines that similar slopes, returns the cluster label of every line
     def _clusterlines(self, lines):
         threshold = math.pi * 10/ 180
-        clusters = [[lines[0]]]
-        for line in lines[1:]:
-            added = False
-            for cluster in clusters:
-                for line2 in cluster:
-                    rads = angle_between_lines(line, line2)
-                    if rads < threshold and rads > -threshold:
-                        cluster.append(line)
-                        added = True
-                        break
-                if added:
-                    break
-            if not added:
-                clusters.append([line])
-
-        return clusters
-
-
-    def _calcclosestpoint(self, center, line):
-        v1 = (center - line[0], center - line[1])
-        v2 = (center - line[2], center - line[3])
-
-        dist = math.hypot(v1[0], v1[1])
-        dist2 = math.hypot(v2[0], v2[1])
-
-        if dist < dist2:
-            return [line[0], line[1]]
-        else:
-            return [line[2], line[3]]
-
-    def _pointdistancetoline(self, point, line):
-        # return (ditance betewen the line and the point, point in the line closer to the point provided as param)
-        vec = (line[0] - line[2], line[1] - line[3])
-        if vec[0] != 0:
-            m = vec[1] / vec[0]
-            b = line[1] - m*line[0]
-            b2 = point[1] + m*point[0]
-            result = np.linalg.solve([[-m, 1], [m, 1]], [b, b2])
-            vec2 = [result[0] - point[0], result[1] - point[1]]
-        else:
-            result = [line[1], point[1]]
-            vec2 = [line[1], point[1]]
-
-        return (math.hypot(vec2[0], vec2[1]), result)
-
-    def _pointdistancetosegment(self, point, segment):
-        dist, point2 = self._pointdistancetoline(point, segment)
-
-        x1, y1, x2, y2 = segment
-
-        v1 = (point[0] - x1, point[1] - y1)
-        v2 = (point[0] - x2, point[1] - y2)
-
-        size_v1 = math.hypot(v1[0], v1[1])
-        size_v2 = math.hypot(v2[0], v2[1])
-
-        pointsx = [x1, x2, point2[0]]
-        pointsy = [y1, y2, point2[1]]
-
-        dists = [size_v1, size_v2]
-
-        if x1 != x2:
-            if max(pointsx) != point2[0] and min(pointsx) != point2[0]:
-                dists.append(dist)
-        else:
-            if max(pointsy) != point2[1] and min(pointsy) != point2[1]:
-                dists.append(dist)
-
-        return min(dists)
-
-
-    def _calcdistance(self, line1, line2, radius):
-        p1 = self._calcclosestpoint(radius, line1)
-        p2 = self._calcclosestpoint(radius, line2)
-
-        p = self._calcclosestpoint(radius, p1 + p2)
-
-        if set(p2) == set(p):
-            return self._pointdistancetoline(p2, line1)[0]
-        else:
-            return self._pointdistancetoline(p1, line2)[0]
-
-    #Max distance between lines in the same cluster
-    def _calcmaxdistance(self, clusters, radius):
-        res = []
-        for cluster in clusters:
-            dist = [0]
-            for line1 in cluster:
-                for line2 in cluster:
-                    try:
-                        dist.append(self._calcdistance(line1, line2, radius))
-                    except np.linalg.linalg.LinAlgError:
-                        continue
-            res.append((cluster, max(dist)))
-        return res
-
-    def _mergelines(self, clusters, radius):
-        lines = []
-        for cluster in clusters:
-            lengths = []
-            line = []
-            avg = [0, 0, 0, 0]
-
-            for line in cluster[0]:
-                lengths.append(math.hypot(line[0] - radius, line[1] - radius))
-                for i in range(0, 4):
-                    avg[i] += line[i]
-
-            for i in range(0, 4):
-                avg[i] = int(round(avg[i] / len(cluster[0])))
-
-            x1, y1, x2, y2 = avg
-            dist = max(lengths)
-            vec = [x1 - x2, y1 - y2]
-            size = math.hypot(vec[0], vec[1])
-
-            vec[0] = int(round(vec[0] / size * dist))
-            vec[1] = int(round(vec[1] / size * dist))
-
-            nvec = np.add((radius, radius), vec)
-
-            line[0] = nvec[0]
-            line[1] = nvec[1]
-            line[2] = line[3] = radius
-
-            newsize = math.hypot(line[0] - line[2], line[1] - line[3])
-
-            lines.append((line, cluster[1], max(size, newsize)))
-
-        return lines
-
-    def _calclines(self, circle):
-        #HoughLines parameters
-        minlinelength = int(round(max(circle.shape) * 0.15))
-        maxlinegap = int(round(max(circle.shape) * 0.015))
-        threshold = int(round(max(circle.shape) * 0.15))
+        clusters = 0
+        orientations = geometry.orientations(lines)
+        labels = np.empty(len(lines), dtype=np.intp)
+        index = geometry.angleindex()
+        for i, line in enumerate(lines):
+            # only lines pointing close to this one can share its cluster
+            candidates = np.array(index.query(orientations[i], threshold * 1.01), dtype=np.intp)
+            if len(candidates):
+                rads = angles_between_lines(line, [lines[j] for j in candidates])
+                candidates = candidates[(rads < threshold) & (rads > -threshold)]
+
+            # joins the first cluster holding a close line
+            if len(candidates):
+                label = labels[candidates].min()
+            else:
+                label = clusters
+                clusters += 1
+            labels[i] = label
+            index.add(orientations[i], i)
+
+        return labels
+
+    #Max distance between lines in the same cluster, one per label
+    def _calcmaxdistance(self, lines, labels, radius):
+        return np.array([geometry.maxpairdistance(lines[labels == label], radius)
+                         for label in range(labels.max() + 1 if len(labels) else 0)], dtype=np.float64)
+
+    # one hand per cluster: the average of its lines, stretched from the center as far as
+    # the farthest tip in the cluster. Returns a geometry.HAND array
+    def _mergelines(self, lines, labels, widths, radius):
+        hands = np.zeros(len(widths), dtype=geometry.HAND)
+        if len(hands) == 0:
+            return hands
+
+        sizes = np.bincount(labels, minlength=len(hands))
+        avg = np.stack([np.bincount(labels, lines[:, i].astype(np.float64), len(hands)) for i in range(4)], axis=1)
+        avg = np.round(avg / sizes[:, np.newaxis])
+
+        tips = np.hypot(lines[:, 0] - radius, lines[:, 1] - radius)
+        dist = np.zeros(len(hands))
+        np.maximum.at(dist, labels, tips)
+
+        vec = avg[:, 0:2] - avg[:, 2:4]
+        size = np.hypot(vec[:, 0], vec[:, 1])
+        # a cluster averaging to a single point keeps it
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vec = np.where((size > 0)[:, np.newaxis], np.round(vec / size[:, np.newaxis] * dist[:, np.newaxis]), vec)
+
+        hands["line"][:, 0:2] = vec + radius
+        hands["line"][:, 2:4] = radius
+        hands["width"] = widths
+        hands["length"] = np.maximum(size, np.hypot(vec[:, 0], vec[:, 1]))
+        return hands
+
+    def _calcedges(self, circle):
         hysteresis_threshold_1 = 70
         hysteresis_threshold_2 = 110
 
         if(len(circle.shape) == 2):
-            gray = circle.copy()
+            gray = circle
         else:
             gray = cv2.cvtColor(circle, cv2.COLOR_BGR2GRAY)
 
-        edges = cv2.Canny(gray, hysteresis_threshold_1, hysteresis_threshold_2)
+        return cv2.Canny(gray, hysteresis_threshold_1, hysteresis_threshold_2)
+
+    def _calclines(self, circle):
+        #HoughLines parameters
+        minlinelength, maxlinegap, threshold = houghparams(max(circle.shape))
+
+        with self._metrics.stage("canny"):
+            edges = self._calcedges(circle)
+        self._metrics.peak("edgesbytes", edges.nbytes)
 
         if self._debug:
-            cv2.imshow("Edges", edges)
-            cv2.waitKey(0)
+            self._debug.show("Edges", edges)
 
-        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold, None, minlinelength, maxlinegap)
+        with self._metrics.stage("houghlines"):
+            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold, None, minlinelength, maxlinegap)
 
         if lines is None:
-            return []
+            return np.empty((0, 4), dtype=np.int32)
         else:
-            return [line[0] for line in lines]
+            return lines[:, 0]
 
     def _filterlines(self, lines, radius):
         #threshold dependant on circle radius
-        threshold = radius * 0.2
-        res = []
-        if lines is None:
-            return res
-
-        for line in lines:
-            x1, y1, x2, y2 = line
+        lines = geometry.aslines(lines)
+        if len(lines) == 0:
+            return lines
 
-            v1 = (radius - x1, radius - y1)
-            v2 = (radius - x2, radius - y2)
+        keep, flip = geometry.filtermask(lines, radius)
 
-            size_v1 = math.hypot(v1[0], v1[1])
-            size_v2 = math.hypot(v2[0], v2[1])
-
-            try:
-                mindist = self._pointdistancetosegment([radius, radius], line)
-            except np.linalg.linalg.LinAlgError:
-                continue
+        # closest point to the center always goes last
+        lines = lines[keep]
+        flip = flip[keep]
+        lines[flip] = lines[flip][:, [2, 3, 0, 1]]
+        return lines
 
-            if mindist < threshold:
-                if size_v1 < size_v2:
-                    line[0] = x2
-                    line[1] = y2
-                    line[2] = x1
-                    line[3] = y1
-                    res.append(line)
-                elif size_v1 > size_v2:
-                    res.append(line)
-        return res
-
-    def _calcpointers(self, lines):
-        if len(lines) > 3 or len(lines) < 1:
+    # picks the (hours, minutes, seconds) lines out of the merged hands: hours is the
+    # shortest hand and seconds the thinnest of the others
+    def _calcpointers(self, hands):
+        if len(hands) > 3 or len(hands) < 1:
             return
 
-        hours = minutes = seconds = None
+        lines = hands["line"].tolist()
+        seconds = None
 
         # hours and minutes hands overlap
-        if len(lines) == 1:
-            hours = minutes = lines[0][0]
-        else:
-            hindex = lines.index(min(lines, key=lambda x: x[2]))
-            hours = lines[hindex][0]
-
-            # check for seconds hand
-            sindex = -1
-            if len(lines) == 3:
-                secwidth = -1
-                for index in enumerate(lines):
-                    if index[0] != hindex:
-                        i = index[0]
-                        if seconds is None or secwidth > lines[i][1]:
-                            sindex = i
-                            secwidth = lines[i][1]
-                            seconds = lines[i][0]
-
-            for index in enumerate(lines):
-                if index[0] != sindex and index[0] != hindex:
-                    minutes = lines[index[0]][0]
-                    break
-
-        return (hours, minutes, seconds)
+        if len(hands) == 1:
+            return (lines[0], lines[0], seconds)
+
+        others = np.ones(len(hands), dtype=bool)
+        hindex = int(np.argmin(hands["length"]))
+        others[hindex] = False
+
+        # check for seconds hand
+        if len(hands) == 3:
+            sindex = int(np.flatnonzero(others)[np.argmin(hands["width"][others])])
+            others[sindex] = False
+            seconds = lines[sindex]
+
+        return (lines[hindex], lines[int(np.flatnonzero(others)[0])], seconds)
 
     def _calctime(self, pointers):
         angles = []
@@ -276,173 +244,270 @@ class clockhandler:
 
         return (h, m, s)
 
+    # joins colinear segments into one line, from the end point farthest from the center to the closest
     def _calccolinearlines(self, lines, center):
-        res = []
         threshold = math.pi * 2.5 / 180
-        colinearlines = []
-        for line1 in lines:
-            added = False
-            for cluster in colinearlines:
-                for line2 in cluster:
-                    points = [[line1[0], line1[1]], [line1[2], line1[3]]]
-                    points += [[line2[0], line2[1]], [line2[2], line2[3]]]
-                    points.sort(key=lambda x: x[0])
-
-                    mab = math.atan2(points[0][1] - points[1][1], points[0][0] - points[1][0])
-                    mac = math.atan2(points[0][1] - points[2][1], points[0][0] - points[2][0])
-                    mad = math.atan2(points[0][1] - points[3][1], points[0][0] - points[3][0])
-
-                    diff = [abs(mab - mac), abs(mab - mad), abs(mac - mad)]
-
-                    try:
-                        mindist1 = self._pointdistancetosegment([line2[0], line2[1]], line1)
-                        mindist2 = self._pointdistancetosegment([line2[2], line2[3]], line1)
-                    except np.linalg.linalg.LinAlgError:
-                        continue
-
-                    if max(diff) < threshold and min(mindist2, mindist1) < center * 0.05:
-                        cluster.append(line1)
-                        added = True
-                        break
-
-                if added:
-                    break
-
-            if not added:
-                colinearlines.append([line1])
-
-        for cluster in colinearlines:
-            proclines = []
-            for line in cluster:
-                dist1 = math.hypot(line[0] - center, line[1] - center)
-                proclines.append([[line[0], line[1]], dist1])
-
-                dist2 = math.hypot(line[2] - center, line[3] - center)
-                proclines.append([[line[2], line[3]], dist2])
-
-            res.append(max(proclines, key=lambda x: x[1])[0] + min(proclines, key=lambda x: x[1])[0])
-
-        return res
-
+        lines = geometry.aslines(lines)
+        if len(lines) == 0:
+            return lines
+
+        clusters = 0
+        members = lines.astype(np.float64)
+        labels = np.empty(len(lines), dtype=np.intp)
+        for count, line1 in enumerate(members):
+            # lines already clustered and the index of their cluster
+            candidates = geometry.nearcandidates(line1, members[:count], center * 0.05)
+            hits = labels[candidates][geometry.colinearmask(line1, members[candidates], threshold, center * 0.05)]
+            # joins the first cluster holding a colinear line
+            if len(hits):
+                label = hits.min()
+            else:
+                label = clusters
+                clusters += 1
+            labels[count] = label
+
+        # end points in line order with their cluster, the first of equally far points wins
+        points = lines.reshape(-1, 2)
+        pointlabels = np.repeat(labels, 2)
+        order = np.arange(len(points))
+        dist = ((points.astype(np.float64) - center) ** 2).sum(axis=1)
+        farthest = np.lexsort((order, -dist, pointlabels))
+        closest = np.lexsort((order, dist, pointlabels))
+        _, first = np.unique(pointlabels[farthest], return_index=True)
+        return np.concatenate([points[farthest[first]], points[closest[first]]], axis=1)
 
     def _processcircle(self, img, radius):
+        if self._engine == ENGINE_POLAR:
+            return self._processpolar(img, radius)
+
+        metrics = self._metrics
         # isolates the circle in a image
-        circle = self._getcircleimg(img, radius)
+        with metrics.stage("mask"):
+            circle = self._getcircleimg(img, radius)
 
         if self._debug:
             # debug image
-            copy = circle.copy()
+            copy = self._debugcopy(circle)
             drawer.drawcenter(copy, radius)
-            cv2.imshow('Circle', copy)
-            cv2.waitKey(0)
+            self._debug.show('Circle', copy)
 
         # get all lines on the image
         lines = self._calclines(circle)
+        metrics.count("houghsegments", len(lines))
 
         if self._debug:
             # debug image
-            copy = circle.copy()
+            copy = self._debugcopy(circle)
             drawer.drawlines(copy, lines)
             drawer.drawcenter(copy, radius)
-            cv2.imshow('Lines', copy)
-            cv2.waitKey(0)
+            self._debug.show('Lines', copy)
 
 
-        lines = self._calccolinearlines(lines, radius)
+        with metrics.stage("colinear"):
+            lines = self._calccolinearlines(lines, radius)
+        metrics.count("colinearclusters", len(lines))
 
         if self._debug:
             # debug image
-            copy = circle.copy()
+            copy = self._debugcopy(circle)
             drawer.drawlines(copy, lines)
             drawer.drawcenter(copy, radius)
-            cv2.imshow('Colinear Lines', copy)
-            cv2.waitKey(0)
+            self._debug.show('Colinear Lines', copy)
 
         # eliminats the lines far away from the centre of the circle
-        lines = self._filterlines(lines, radius)
+        with metrics.stage("filter"):
+            lines = self._filterlines(lines, radius)
+        metrics.count("filteredlines", len(lines))
 
         if self._debug:
             # debug image
-            copy = circle.copy()
+            copy = self._debugcopy(circle)
             drawer.drawlines(copy, lines)
             drawer.drawcenter(copy, radius)
-            cv2.imshow('Filtered Lines', copy)
-            cv2.waitKey(0)
+            self._debug.show('Filtered Lines', copy)
 
         # if circle has no lines it cannot be a clock
-        if not lines:
-            return
+        if len(lines) == 0:
+            return clockresult(STATUS_NO_LINES, center=(radius, radius), radius=radius)
 
         # group lines acording to their angle diference
-        clusters = self._clusterlines(lines)
+        with metrics.stage("clustering"):
+            labels = self._clusterlines(lines)
 
         # gets the max distance between all the lines in a cluster
-        clusters = self._calcmaxdistance(clusters, radius)
+        with metrics.stage("maxdistance"):
+            widths = self._calcmaxdistance(lines, labels, radius)
+        metrics.count("clusters", len(widths))
 
-        # calc the avg point in each cluster to obtain single lines
-        lines = self._mergelines(clusters, radius)
+        # calc the avg point in each cluster to obtain single hands
+        with metrics.stage("merge"):
+            hands = self._mergelines(lines, labels, widths, radius)
 
         if self._debug:
             # debug image
-            copy = circle.copy()
+            copy = self._debugcopy(circle)
             drawer.drawaxis(copy, radius)
-            drawer.drawlines(copy, lines)
+            drawer.drawlines(copy, hands["line"])
             drawer.drawcenter(copy, radius)
-            cv2.imshow('Merged Lines', copy)
-            cv2.waitKey(0)
+            self._debug.show('Merged Lines', copy)
 
         # determines the (hours, minutes, secounds) pointers
-        pointers = self._calcpointers(lines)
+        pointers = self._calcpointers(hands)
 
         if pointers is None:
-            print("Too many lines found on the clock")
-            return
+            return clockresult(STATUS_TOO_MANY_LINES, center=(radius, radius), radius=radius)
 
         # calc the time correspondet to each pointer
-        h, m, s = self._calctime(pointers)
+        with metrics.stage("timecalc"):
+            h, m, s = self._calctime(pointers)
 
-        time = (str(h) if h > 9 else '0' + str(h)) + ':'\
-         + (str(m) if m > 9 else '0' + str(m))\
-          + ':' + (str(s) if s > 9 else '0' + str(s))
-
-        # debug image
-        if not self._test:
-            copy = circle.copy()
+        if self._debug:
+            # debug image
+            copy = self._debugcopy(circle)
             drawer.drawaxis(copy, radius)
-            drawer.drawlines(copy, lines)
+            drawer.drawlines(copy, hands["line"])
             drawer.drawcenter(copy, radius)
-            drawer.drawtime(copy, pointers, time)
-            #cv2.imshow('Final', copy)
-            #cv2.waitKey(0)
-            print("Time: " + time)
-        return (h,m,s)
+            drawer.drawtime(copy, pointers, formattime((h, m, s)))
+            self._debug.show('Final', copy)
 
-    def getwatchcircle(self):
+        return self._result(radius, pointers, (h, m, s))
+
+    def _result(self, radius, pointers, time):
+        hands = dict((name, (int(pt[0]), int(pt[1]))) for name, pt in zip(HANDS, pointers) if pt is not None)
+        return clockresult(STATUS_OK, center=(radius, radius), radius=radius, hands=hands, time=tuple(int(t) for t in time))
+
+    # reads the hands on the unwrapped face instead of line segments, see polar.py
+    def _processpolar(self, img, radius):
+        with self._metrics.stage("mask"):
+            circle = self._getcircleimg(img, radius)
+        with self._metrics.stage("polar"):
+            pointers = polar.findpointers(circle, radius)
+        if pointers is None:
+            return clockresult(STATUS_NO_LINES, center=(radius, radius), radius=radius)
+
+        h, m, s = self._calctime(pointers)
+
+        if self._debug:
+            # debug image
+            copy = self._debugcopy(circle)
+            drawer.drawaxis(copy, radius)
+            drawer.drawlines(copy, [pt for pt in pointers if pt is not None])
+            drawer.drawcenter(copy, radius)
+            drawer.drawtime(copy, pointers, formattime((h, m, s)))
+            self._debug.show('Polar', copy)
+
+        return self._result(radius, pointers, (h, m, s))
+
+    def _processcrop(self, circle, radius, center):
+        if circle is None:
+            return clockresult(STATUS_OUT_OF_BOUNDS, radius=radius).moveto(center)
+        return self._processcircle(circle, radius).moveto(center)
+
+    # fits a circle to the edges found close to a coarse estimate, keeps the estimate if too few
+    def _refinecircle(self, x, y, radius, margin):
+        x0 = max(int(x - radius - margin), 0)
+        y0 = max(int(y - radius - margin), 0)
+        window = self._img[y0:int(y + radius + margin) + 1, x0:int(x + radius + margin) + 1]
+        edges = cv2.Canny(window, 25, 50)
+
+        ys, xs = np.nonzero(edges)
+        dist = np.hypot(xs + x0 - x, ys + y0 - y)
+        ring = np.abs(dist - radius) <= margin
+        if np.count_nonzero(ring) < radius:
+            return (x, y, radius)
+
+        cx, cy, r = geometry.fitcircle(np.column_stack([xs[ring] + x0, ys[ring] + y0]))
+        if math.hypot(cx - x, cy - y) > margin or abs(r - radius) > margin:
+            return (x, y, radius)
+        return (cx, cy, r)
+
+    def _findcircles(self, img, threshold):
         #minimum radius dependant on image original size
-        minrad = int(round(min(self._img.shape) * 0.1))
+        minrad = int(round(min(img.shape) * 0.1))
         maxrad = 0
-        mindist = int(round(min(self._img.shape) * 0.15))
+        mindist = int(round(min(img.shape) * 0.15))
 
-        circles = cv2.HoughCircles(self._img, cv2.HOUGH_GRADIENT, 1,
-                                   mindist, param1=50, param2=self._circleThreshold, minRadius=minrad, maxRadius=maxrad)
+        circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, 1,
+                                   mindist, param1=50, param2=threshold, minRadius=minrad, maxRadius=maxrad)
         if circles is None or len(circles) == 0:
-            print("No circle clocks detected on image!")
+            return None
+        return circles
+
+    def _findcirclespyramid(self, scale, threshold):
+        metrics = self._metrics
+        with metrics.stage("downscale"):
+            small = cv2.resize(self._img, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+        with metrics.stage("houghcircles"):
+            circles = self._findcircles(small, threshold)
+        if circles is None:
+            return None
+
+        margin = 2 * scale + 1
+        with metrics.stage("pyramidrefine"):
+            refined = [self._refinecircle(x * scale, y * scale, r * scale, margin) for x, y, r in circles[0]]
+        return np.array([refined], dtype=np.float32)
+
+    # the candidates of a permissive search whose rim support reaches the highest level any
+    # candidate inside the image reaches, in their HoughCircles order. Edges are only found
+    # around each candidate, with the pyramid the full size image is never searched whole
+    def _selectcircles(self, circles):
+        img = self._img
+        height, width = img.shape
+        support = np.array([geometry.rimsupport(img, (x, y), r, AUTO_SAMPLES) for x, y, r in circles[0]])
+        inside = np.array([x - r >= 0 and y - r >= 0 and x + r <= width and y + r <= height for x, y, r in circles[0]])
+        for level in AUTO_LEVELS:
+            if np.any(inside & (support >= level)):
+                self.autolevel = level
+                return circles[:, support >= level]
+        return None
+
+    def getwatchcircle(self):
+        metrics = self._metrics
+        with metrics.stage("blur"):
+            img = self._img
+        metrics.peak("imagebytes", img.nbytes)
+
+        auto = self._circleThreshold == THRESHOLD_AUTO
+        threshold = AUTO_PARAM2 if auto else self._circleThreshold
+        scale = min(self._pyramid, min(img.shape) / PYRAMID_MIN_SIZE)
+        if scale > 1:
+            circles = self._findcirclespyramid(scale, threshold)
+        else:
+            with metrics.stage("houghcircles"):
+                circles = self._findcircles(img, threshold)
+        if auto and circles is not None:
+            metrics.count("autocandidates", len(circles[0]))
+            with metrics.stage("autothreshold"):
+                circles = self._selectcircles(circles)
+        if circles is None:
+            metrics.count("circlecandidates", 0)
             return []
+        metrics.count("circlecandidates", len(circles[0]))
 
         # rounds the circle points and converts to Mat
         circles = np.uint16(np.around(circles))
-        clock_results = []
+        crops = []
 
         for i in circles[0]:
             # ignore circles that are partially outside of the image
             if (np.int32(i[CENTER_X]) - np.int32(i[RADIUS]) < 0 or np.int32(i[CENTER_Y]) - np.int32(i[RADIUS]) < 0
                     or i[CENTER_X] + i[RADIUS] > self._img.shape[1] or i[CENTER_Y] + i[RADIUS] > self._img.shape[0]):
-                print('skip')
+                crops.append((None, i[RADIUS], (i[CENTER_X], i[CENTER_Y])))
                 continue
 
-            #crop circle from original image
-            circle = self._cimg[i[CENTER_Y] - i[RADIUS]:i[CENTER_Y] + i[RADIUS], i[CENTER_X] - i[RADIUS]:i[CENTER_X] + i[RADIUS]].copy()
+            #crop circle from the blurred image, a view since _getcircleimg never writes to it
+            circle = self._img[i[CENTER_Y] - i[RADIUS]:i[CENTER_Y] + i[RADIUS], i[CENTER_X] - i[RADIUS]:i[CENTER_X] + i[RADIUS]]
+            crops.append((circle, i[RADIUS], (i[CENTER_X], i[CENTER_Y])))
 
-            clock_results.append(self._processcircle(circle, i[RADIUS]))
+        workers = min(self._workers or multiprocessing.cpu_count(), len(crops))
+        # debug windows block on user input and stage images are numbered, keep them in order on this thread
+        if workers <= 1 or self._debug:
+            results = [self._processcrop(*crop) for crop in crops]
+        else:
+            # OpenCV releases the GIL, so candidates are processed side by side; map keeps their order
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda crop: self._processcrop(*crop), crops))
 
-        return clock_results
+        for result in results:
+            result.threshold = self.autolevel
+        return results
@@ -0,0 +1,122 @@
+"""Where the --debug stage images go: blocking windows, or image files and memory written on a background thread"""
+import itertools
+import os
+import queue
+import re
+import threading
+import cv2
+
+DEFAULT_EVERY = 1
+DEFAULT_PENDING = 64
+
+# the original behaviour, every stage waits for a key press
+class windowsink:
+    def request(self):
+        return self
+
+    def show(self, name, img):
+        cv2.imshow(name, img)
+        cv2.waitKey(0)
+
+    def close(self):
+        pass
+
+WINDOWS = windowsink()
+
+# stage images of the detections of one request, numbered in the order they were shown
+class _requestsink:
+    def __init__(self, sink, index):
+        self._sink = sink
+        self._index = index
+        self._steps = itertools.count()
+
+    def request(self):
+        return self
+
+    def show(self, name, img):
+        self._sink._push(self._index, next(self._steps), name, img)
+
+# keeps the stage images of one in every requests without ever waiting on the disk: images are
+# encoded and written by a background thread, and dropped when more than maxpending are waiting.
+# With a directory they become files, without one they are kept in images as (request, step, name, bytes)
+class imagesink:
+    def __init__(self, directory=None, every=DEFAULT_EVERY, maxpending=DEFAULT_PENDING, ext=".png"):
+        self._directory = directory
+        self._every = every
+        self._maxpending = maxpending
+        self._ext = ext
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.images = []
+        self.written = 0
+        self.dropped = 0
+        self._requests = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = queue.Queue(maxpending)
+        self._thread = None
+
+    # worker processes get the same settings and their own writer thread, see batch._initworker
+    def __getstate__(self):
+        return {"directory": self._directory, "every": self._every, "maxpending": self._maxpending, "ext": self._ext}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    # the sink of the next request, None when it is not sampled
+    def request(self):
+        with self._lock:
+            index = next(self._requests)
+        return _requestsink(self, index) if index % self._every == 0 else None
+
+    # images shown outside of a request, e.g. by a clockhandler used on its own
+    def show(self, name, img):
+        self._push(None, 0, name, img)
+
+    def _push(self, index, step, name, img):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write, name="debugsink", daemon=True)
+                self._thread.start()
+        # the buffers the stages draw on are reused, the queue keeps its own copy
+        try:
+            self._pending.put_nowait((index, step, name, img.copy()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _filename(self, index, step, name):
+        name = re.sub(r"[^a-z0-9]+", "_", name.lower())
+        return "%d_%06d_%02d_%s%s" % (os.getpid(), -1 if index is None else index, step, name, self._ext)
+
+    def _write(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            index, step, name, img = item
+            data = cv2.imencode(self._ext, img)[1].tobytes()
+            if self._directory is None:
+                self.images.append((index, step, name, data))
+            else:
+                with open(os.path.join(self._directory, self._filename(index, step, name)), "wb") as f:
+                    f.write(data)
+            with self._lock:
+                self.written += 1
+
+    # waits until every pending image is written
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._pending.put(None)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {"written": self.written, "dropped": self.dropped, "pending": self._pending.qsize()}
+
+# debug may be False/None (off), True (windows) or a sink
+def getdebug(debug):
+    if not debug:
+        return None
+    return WINDOWS if debug is True else debug
@@ -0,0 +1,75 @@
+"""Image decoding at reduced resolution, the circle search does not need every pixel of a large photo"""
+import io
+import struct
+import cv2
+import numpy as np
+
+# imread flags per reduction, JPEG decoders scale down while decoding, other formats resize after it
+REDUCTIONS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+              4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+# JPEG start of frame markers, the ones holding the image size
+_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def _jpegsize(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] == 0xFF:
+            # fill byte before a marker
+            f.seek(-1, io.SEEK_CUR)
+            continue
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        if marker[1] in _SOF:
+            header = f.read(5)
+            if len(header) < 5:
+                return None
+            height, width = struct.unpack(">HH", header[1:5])
+            return (width, height)
+        f.seek(struct.unpack(">H", length)[0] - 2, io.SEEK_CUR)
+
+# (width, height) read from the header of a JPEG or PNG file object, None for anything else
+def headersize(f):
+    start = f.read(24)
+    if start[:2] == b"\xff\xd8":
+        return _jpegsize(f)
+    if start[:8] == b"\x89PNG\r\n\x1a\n" and start[12:16] == b"IHDR":
+        return struct.unpack(">II", start[16:24])
+    return None
+
+# largest reduction that keeps the long side at or above target pixels
+def choosereduction(size, target):
+    if not target or size is None:
+        return 1
+    for factor in (8, 4, 2):
+        if max(size) / factor >= target:
+            return factor
+    return 1
+
+# (gray image, reduction) of a file, decoded no larger than needed for a long side of target pixels.
+# Without a target the header is not read, imread answers None for files it cannot open
+def readimage(path, target=None, factor=None):
+    if factor is None and not target:
+        factor = 1
+    elif factor is None:
+        with open(path, "rb") as f:
+            factor = choosereduction(headersize(f), target)
+    return cv2.imread(path, REDUCTIONS[factor]), factor
+
+# the same for encoded bytes
+def decodeimage(data, target=None):
+    factor = choosereduction(headersize(io.BytesIO(data)), target) if target else 1
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), REDUCTIONS[factor]), factor
+
+# reduction at which a clock of radius pixels at full size keeps at least minradius of them
+def refinereduction(radius, factor, minradius):
+    for finer in (4, 2, 1):
+        if finer < factor and radius / finer >= minradius:
+            return finer
+    return 1
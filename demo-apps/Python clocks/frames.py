@@ -0,0 +1,71 @@
+"""Frames handed over without a copy: memory-mapped .npy and raw files, and shared memory blocks"""
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+# (height, width) or (height, width, 3) from "HxW", "HxWx3" or a list
+def parseshape(value):
+    if isinstance(value, str):
+        value = value.lower().split("x")
+    try:
+        shape = tuple(int(part) for part in value)
+    except (TypeError, ValueError):
+        raise ValueError("%s is not a HEIGHTxWIDTH shape" % (value,))
+    if len(shape) not in (2, 3) or min(shape) <= 0 or (len(shape) == 3 and shape[2] != 3):
+        raise ValueError("%s is not a HEIGHTxWIDTH or HEIGHTxWIDTHx3 shape" % ("x".join(map(str, shape)),))
+    return shape
+
+# the detectors work on 8 bit gray or BGR frames, anything else would need a converted copy
+def checkframe(img):
+    if img.dtype != np.uint8:
+        raise ValueError("frames must be uint8, got %s" % img.dtype)
+    if img.ndim not in (2, 3) or (img.ndim == 3 and img.shape[2] != 3):
+        raise ValueError("frames must be gray or 3 channel, got shape %s" % (img.shape,))
+    return img
+
+# the array of a .npy file, paged in as the detectors read it
+def mapnpy(path):
+    return checkframe(np.load(path, mmap_mode="r"))
+
+# a raw file of frames with no header, offset bytes in
+def mapraw(path, shape, dtype=np.uint8, offset=0):
+    return checkframe(np.memmap(path, dtype=np.dtype(dtype), mode="r", offset=offset, shape=parseshape(shape)))
+
+# the creator unlinks the block, not the resource tracker of this process when it exits
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 attaching always registers the block
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+# the frame held in a shared memory block another process created and owns. Use as a context
+# manager and let the array go before it exits: the block cannot be closed while views of it exist
+class sharedframe:
+    def __init__(self, name, shape, dtype=np.uint8):
+        shape = parseshape(shape)
+        dtype = np.dtype(dtype)
+        checkframe(np.empty((1, 1) + shape[2:], dtype=dtype))
+        self._block = _attach(name)
+        if self._block.size < int(np.prod(shape)) * dtype.itemsize:
+            self._block.close()
+            raise ValueError("shared memory block %s holds %d bytes, too small for %s %s" % (name, self._block.size, shape, dtype))
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self._block.buf)
+
+    def close(self):
+        self.array = None
+        if self._block is not None:
+            try:
+                self._block.close()
+                self._block = None
+            except BufferError:
+                # a view is still alive somewhere, the block is closed when this frame is collected
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,191 @@
+"""Array versions of the clockhandler line helpers.
+
+Lines are (..., 4) arrays of [x1, y1, x2, y2] and points are (..., 2) arrays,
+broadcast against each other. Rows for which the scalar helpers raise
+LinAlgError (horizontal lines) come back as nan. Clusters of lines are an
+array of labels, one per line, numbered in order of first appearance.
+"""
+import bisect
+import math
+import cv2
+import numpy as np
+
+# one merged hand: its line from the tip to the center, the max distance between the lines
+# merged into it (how wide the hand is) and its length
+HAND = np.dtype([("line", np.int32, 4), ("width", np.float64), ("length", np.float64)])
+
+def _split(array, size):
+    array = np.asarray(array, dtype=np.float64)
+    return [array[..., i] for i in range(size)]
+
+# same as the scalar _pointdistancetoline of bench_clustering: (distance, point on the line)
+def pointdistancetolines(points, lines):
+    px, py = _split(points, 2)
+    x1, y1, x2, y2 = _split(lines, 4)
+    dx = x1 - x2
+    dy = y1 - y2
+
+    vertical = dx == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = dy / dx
+        b = y1 - m * x1
+        b2 = py + m * px
+        # solution of [[-m, 1], [m, 1]] . [x, y] = [b, b2]
+        ry = (b + b2) / 2
+        rx = (b - ry) / -m
+
+    rx = np.where(vertical, y1, rx)
+    ry = np.where(vertical, py, ry)
+    dist = np.hypot(np.where(vertical, y1, rx - px), np.where(vertical, py, ry - py))
+
+    singular = ~vertical & (m == 0)
+    dist = np.where(singular, np.nan, dist)
+    closest = np.stack([np.where(singular, np.nan, rx), np.where(singular, np.nan, ry)], axis=-1)
+    return dist, closest
+
+def _strictlybetween(value, a, b):
+    return (value > np.minimum(a, b)) & (value < np.maximum(a, b))
+
+# same as the scalar _pointdistancetosegment of bench_clustering
+def pointdistancetosegments(points, segments):
+    dist, closest = pointdistancetolines(points, segments)
+    px, py = _split(points, 2)
+    x1, y1, x2, y2 = _split(segments, 4)
+
+    res = np.minimum(np.hypot(px - x1, py - y1), np.hypot(px - x2, py - y2))
+    inside = np.where(x1 != x2, _strictlybetween(closest[..., 0], x1, x2),
+                      _strictlybetween(closest[..., 1], y1, y2))
+    res = np.where(inside & (dist < res), dist, res)
+    return np.where(np.isnan(dist), np.nan, res)
+
+# squared distance of both end points to (center, center)
+def _endpointdistances(center, lines):
+    x1, y1, x2, y2 = _split(lines, 4)
+    return ((center - x1) ** 2 + (center - y1) ** 2, (center - x2) ** 2 + (center - y2) ** 2)
+
+# same as the scalar _calcclosestpoint of bench_clustering, ties pick the second end point
+def closestpoints(center, lines):
+    lines = np.asarray(lines)
+    d1, d2 = _endpointdistances(center, lines)
+    first = (d1 < d2)[..., np.newaxis]
+    return np.where(first, lines[..., 0:2], lines[..., 2:4])
+
+def orientations(lines):
+    x1, y1, x2, y2 = _split(lines, 4)
+    return np.arctan2(y2 - y1, x2 - x1)
+
+# sorted orientations, answers "which lines point within width of this angle" in O(log n)
+class angleindex:
+    def __init__(self):
+        self._angles = []
+        self._items = []
+
+    def add(self, angle, item):
+        pos = bisect.bisect(self._angles, angle)
+        self._angles.insert(pos, angle)
+        self._items.insert(pos, item)
+
+    def _range(self, low, high):
+        return self._items[bisect.bisect_left(self._angles, low):bisect.bisect_right(self._angles, high)]
+
+    # angles wrap around at +-pi
+    def query(self, angle, width):
+        items = self._range(angle - width, angle + width)
+        if angle - width < -math.pi:
+            items += self._range(angle - width + 2 * math.pi, math.pi)
+        if angle + width > math.pi:
+            items += self._range(-math.pi, angle + width - 2 * math.pi)
+        return items
+
+# lines with an end point inside the bounding box of line grown by distance. Any line within
+# distance of the segment is among them, except for vertical segments (see pointdistancetolines)
+def nearcandidates(line, lines, distance):
+    x1, y1, x2, y2 = _split(line, 4)
+    if x1 == x2:
+        return np.arange(len(lines))
+
+    lines = np.asarray(lines)
+    xmin, xmax = min(x1, x2) - distance, max(x1, x2) + distance
+    ymin, ymax = min(y1, y2) - distance, max(y1, y2) + distance
+    near = np.zeros(len(lines), dtype=bool)
+    for i in (0, 2):
+        near |= (lines[:, i] >= xmin) & (lines[:, i] <= xmax) & (lines[:, i + 1] >= ymin) & (lines[:, i + 1] <= ymax)
+    return np.flatnonzero(near)
+
+# (keep, flip) masks of clockhandler._filterlines: keep lines passing near the center,
+# flip the ones whose first point is the closest to it
+def filtermask(lines, radius):
+    mindist = pointdistancetosegments((radius, radius), lines)
+    d1, d2 = _endpointdistances(radius, lines)
+    with np.errstate(invalid='ignore'):
+        keep = (mindist < radius * 0.2) & (d1 != d2)
+    return keep, d1 < d2
+
+# which of lines are colinear with line, as tested by clockhandler._calccolinearlines
+def colinearmask(line, lines, anglethreshold, distthreshold):
+    lines = np.asarray(lines).reshape(-1, 4)
+    line = np.broadcast_to(np.asarray(line), lines.shape)
+
+    points = np.concatenate([line, lines], axis=1).reshape(-1, 4, 2).astype(np.float64)
+    order = np.argsort(points[..., 0], axis=1, kind='stable')
+    points = np.take_along_axis(points, order[..., np.newaxis], axis=1)
+
+    delta = points[:, :1] - points[:, 1:]
+    slopes = np.arctan2(delta[..., 1], delta[..., 0])
+    spread = slopes.max(axis=1) - slopes.min(axis=1)
+
+    mindist = np.minimum(pointdistancetosegments(lines[:, 0:2], line),
+                         pointdistancetosegments(lines[:, 2:4], line))
+    with np.errstate(invalid='ignore'):
+        return (spread < anglethreshold) & (mindist < distthreshold)
+
+# (N, 4) array of lines, empty ones included
+def aslines(lines):
+    return np.asarray(lines).reshape(-1, 4)
+
+# max of the scalar _calcdistance of bench_clustering over every pair of lines, 0 when no pair can be measured
+def maxpairdistance(lines, radius):
+    lines = np.asarray(lines).reshape(-1, 4)
+    if len(lines) == 0:
+        return 0
+
+    d1, d2 = _endpointdistances(radius, lines)
+    points = closestpoints(radius, lines)
+
+    # pairs (i, j) as rows (line1) by columns (line2)
+    p1 = points[:, np.newaxis, :]
+    p2 = points[np.newaxis, :, :]
+    d1 = np.minimum(d1, d2)[:, np.newaxis]
+    d2 = d1.T
+    same = ((p1[..., 0] == p2[..., 0]) & (p1[..., 1] == p2[..., 1])) | \
+           ((p1[..., 0] == p2[..., 1]) & (p1[..., 1] == p2[..., 0]))
+    usep2 = ~(d1 < d2) | same
+
+    distp2, _ = pointdistancetolines(p2, lines[:, np.newaxis, :])
+    distp1, _ = pointdistancetolines(p1, lines[np.newaxis, :, :])
+    dist = np.where(usep2, distp2, distp1)
+    return max(0, np.nanmax(dist)) if not np.all(np.isnan(dist)) else 0
+
+# fraction of samples points on the circle that fall on nonzero pixels of edges
+def ringsupport(edges, x, y, radius, samples=64):
+    angles = np.linspace(0, 2 * math.pi, samples, endpoint=False)
+    xs = np.clip(np.round(x + radius * np.cos(angles)).astype(int), 0, edges.shape[1] - 1)
+    ys = np.clip(np.round(y + radius * np.sin(angles)).astype(int), 0, edges.shape[0] - 1)
+    return np.count_nonzero(edges[ys, xs]) / samples
+
+# ringsupport of the circle on the dilated Canny edges of a window of img just around it
+def rimsupport(img, center, radius, samples=64):
+    x, y = center
+    x0, y0 = max(int(x - radius) - 2, 0), max(int(y - radius) - 2, 0)
+    window = img[y0:int(y + radius) + 3, x0:int(x + radius) + 3]
+    edges = cv2.dilate(cv2.Canny(window, 25, 50), None)
+    return ringsupport(edges, x - x0, y - y0, radius, samples)
+
+# least squares (Kasa) circle through an (N, 2) array of points: (center x, center y, radius)
+def fitcircle(points):
+    points = np.asarray(points, dtype=np.float64)
+    a = np.column_stack([points, np.ones(len(points))])
+    b = -(points ** 2).sum(axis=1)
+    (d, e, f), _, _, _ = np.linalg.lstsq(a, b, rcond=None)
+    cx, cy = -d / 2, -e / 2
+    return cx, cy, math.sqrt(max(cx * cx + cy * cy - f, 0))
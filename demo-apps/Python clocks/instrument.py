@@ -0,0 +1,74 @@
+"""Opt-in stage timers, counters and peak sizes of one detection"""
+import threading
+import time
+
+class _stage:
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.addtime(self._name, time.perf_counter() - self._start)
+        return False
+
+# collects what one processImage call did. Candidates are processed on threads, so stages
+# of the same name add up: timers hold the total seconds, counts the sum, peaks the max
+class metrics:
+    def __init__(self):
+        self.timers = {}
+        self.counts = {}
+        self.peaks = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _stage(self, name)
+
+    def addtime(self, name, seconds):
+        with self._lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    # largest size seen, e.g. the bytes of an array
+    def peak(self, name, value):
+        with self._lock:
+            self.peaks[name] = max(self.peaks.get(name, 0), int(value))
+
+    # timers in milliseconds
+    def todict(self):
+        return {"timers": dict((name, seconds * 1000) for name, seconds in self.timers.items()),
+                "counts": dict(self.counts), "peaks": dict(self.peaks)}
+
+class _nostage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+# stands in when instrumentation is off, every call is a no-op
+class _nometrics:
+    _stage = _nostage()
+
+    def stage(self, name):
+        return self._stage
+
+    def addtime(self, name, seconds):
+        pass
+
+    def count(self, name, value):
+        pass
+
+    def peak(self, name, value):
+        pass
+
+NOMETRICS = _nometrics()
+
+def getmetrics(value):
+    return NOMETRICS if value is None else value
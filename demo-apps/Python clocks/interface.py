@@ -1,18 +1,120 @@
 import argparse
-import cv2
-from clockhandler import clockhandler
-from squares import squares
-from webcam import getWebcamImage, ESC_KEY_CODE
+import sys
+from clockhandler import clockhandler, ENGINES, ENGINE_HOUGH, THRESHOLD_AUTO
+from squares import squares, DEFAULT_LEVELS
+from debugsink import getdebug
+from instrument import getmetrics, metrics as stagemetrics
+from preprocess import getcontext
+from results import clockresult, serializer, FORMATS, KIND_CIRCLE, STATUS_OK, STATUS_NO_CLOCK, STATUS_OUT_OF_BOUNDS
+
+def _found(results):
+    return any(result.status != STATUS_OUT_OF_BOUNDS for result in results)
 
 #if no circle clocks detected try to detect square clocks
-def processImage(img,debug,threshold):
+#metrics is an instrument.metrics that collects the stage timers and counts of this call
+#cache is a cache.resultcache answering images already seen with the same parameters
+#registry is a registry.roiregistry holding where the clocks of camera are, they are only searched for
+#when it has none for this camera or the stored ones no longer look like clocks
+def processImage(img,debug,threshold,workers=None,pyramid=1,squarelevels=DEFAULT_LEVELS,squaremin=None,engine=ENGINE_HOUGH,metrics=None,cache=None,registry=None,camera=None):
+    metrics = getmetrics(metrics)
+    with metrics.stage("total"):
+        # both detectors share the blurred images of this frame
+        img = getcontext(img)
+        # a sampling sink answers None for the requests it skips
+        debug = getdebug(debug)
+        if debug is not None:
+            debug = debug.request()
+        # debug runs are for looking at the stages, they always run them
+        key = None
+        if cache is not None and not debug:
+            key = cache.key(img.gray, threshold=threshold, pyramid=pyramid, squarelevels=squarelevels, squaremin=squaremin, engine=engine)
+            results = cache.get(key)
+            metrics.count("cachehits", results is not None)
+            if results is not None:
+                return results
+        results = None
+        if registry is not None and camera is not None:
+            with metrics.stage("registry"):
+                results = registry.read(camera, img, engine, debug)
+            metrics.count("registryhits", results is not None)
+        if results is None:
+            results = _locate(img,debug,threshold,workers,pyramid,squarelevels,squaremin,engine,metrics)
+            if registry is not None and camera is not None:
+                registry.put(camera, img.shape, results)
+        if key is not None:
+            cache.put(key, results)
+    return results
+
+def _locate(img,debug,threshold,workers,pyramid,squarelevels,squaremin,engine,metrics):
     if threshold is None:
-        ch = clockhandler(img, debug=debug)
+        ch = clockhandler(img, debug=debug, workers=workers, pyramid=pyramid, engine=engine, metrics=metrics)
     else:
-        ch = clockhandler(img, debug=debug,threshold = threshold)
-    if len(ch.getwatchcircle()) == 0:
-        sq = squares(img,debug=debug)
-        sq._process_square()
+        ch = clockhandler(img, debug=debug,threshold = threshold, workers=workers, pyramid=pyramid, engine=engine, metrics=metrics)
+    results = ch.getwatchcircle()
+    if not _found(results):
+        sq = squares(img,debug=debug,levels=squarelevels,minsquares=squaremin,workers=workers,engine=engine,metrics=metrics)
+        results += sq._process_square()
+    if not _found(results):
+        results.append(clockresult(STATUS_NO_CLOCK))
+    return results
+
+# reads the clocks found on an image decoded factor times smaller again on a finer decode of the file,
+# so their hands get at least minradius pixels. JPEG cannot be decoded in parts, the finer image is
+# decoded whole and only the clock regions are kept. Results are in full size coordinates
+def _refine(path, results, factor, minradius, engine=ENGINE_HOUGH):
+    import decode
+    decoded = {}
+    for index, result in enumerate(results):
+        if result.center is None or result.status == STATUS_OUT_OF_BOUNDS or result.radius / factor >= minradius:
+            continue
+        finer = decode.refinereduction(result.radius, factor, minradius)
+        if finer not in decoded:
+            decoded[finer] = decode.readimage(path, factor=finer)[0]
+        img = decoded[finer]
+        if img is None:
+            break
+
+        x, y, radius = [int(round(value / finer)) for value in result.center + (result.radius,)]
+        if x - radius < 0 or y - radius < 0 or x + radius > img.shape[1] or y + radius > img.shape[0]:
+            continue
+        # circles are read on the blurred image, squares on the original one
+        crop = img[y - radius:y + radius, x - radius:x + radius]
+        if result.kind == KIND_CIRCLE:
+            crop = getcontext(crop).median()
+        refined = clockhandler(crop, workers=1, engine=engine)._processcrop(crop, radius, (x, y))
+        refined.kind = result.kind
+        # keeps the coarse reading when the finer one finds less
+        if refined.status == STATUS_OK or result.status != STATUS_OK:
+            results[index] = refined.scale(finer)
+    return results
+
+# processImage on an image file, decoded at a reduced resolution when its long side is at least twice
+# target pixels. Results are always in the coordinates of the full size image. Clocks found with a
+# radius under refine pixels on the reduced image are read again on a finer one
+def processFile(path,debug,target=None,refine=None,metrics=None,**options):
+    import decode
+    metrics = getmetrics(metrics)
+    with metrics.stage("decode"):
+        img, factor = decode.readimage(path, target)
+    if img is None:
+        return None
+    metrics.count("reduction", factor)
+    results = [result.scale(factor) for result in processImage(img,debug,metrics=metrics,**options)]
+    if factor > 1 and refine:
+        with metrics.stage("refine"):
+            results = _refine(path, results, factor, refine, options.get("engine", ENGINE_HOUGH))
+    return results
+
+def check_scale(value):
+    fvalue = float(value)
+    if fvalue < 1:
+         raise argparse.ArgumentTypeError("%s is an invalid scale, it must be at least 1" % value)
+    return fvalue
+
+def check_threshold(value):
+    if value == THRESHOLD_AUTO:
+        return value
+    return check_positive(value)
 
 def check_positive(value):
     ivalue = int(value)
@@ -21,24 +123,138 @@ def check_positive(value):
     return ivalue
 
 
-parser = argparse.ArgumentParser(description="Time detection on watch images.")
-parser.add_argument("--filename","-f", help="relative path to image file to analyse.")
-parser.add_argument("--threshold","-t", help="Circle detection threshold. Lower number means more false circles detected. Default: 150",type=check_positive)
-parser.add_argument("--webcam","-w", help="use webcam to capture image.", action="store_true")
-parser.add_argument("--debug","-d", help="to see the processing steps.", action="store_true")
-args = parser.parse_args()
-if args.webcam:
-    while True:
-        res = getWebcamImage()
-        if res[1] == ESC_KEY_CODE:
-            break
+def main():
+    parser = argparse.ArgumentParser(description="Time detection on watch images.")
+    parser.add_argument("--filename","-f", help="relative path to image file to analyse, .npy files are memory-mapped.")
+    parser.add_argument("--raw", help="raw uint8 frame file to analyse in place, needs --shape.")
+    parser.add_argument("--shm", help="name of a shared memory block holding the uint8 frame to analyse, needs --shape.")
+    parser.add_argument("--shape", help="with --raw or --shm, frame shape as HEIGHTxWIDTH, or HEIGHTxWIDTHx3 for BGR.")
+    parser.add_argument("--offset", help="with --raw, bytes to skip before the frame. Default: 0",type=int, default=0)
+    parser.add_argument("--target-size", help="with --filename, --batch or --server, decode images 2, 4 or 8 times smaller while their long side stays above this many pixels. Default: 0 (full size)",type=int, default=0)
+    parser.add_argument("--refine-radius", help="with --target-size, read clocks found smaller than this radius again on a finer decode. Default: 0 (off)",type=int, default=0)
+    parser.add_argument("--threshold","-t", help="Circle detection threshold. Lower number means more false circles detected, auto searches once with a low threshold and keeps the circles best supported by edges. Default: 150",type=check_threshold)
+    parser.add_argument("--webcam","-w", help="use webcam to capture image.", action="store_true")
+    parser.add_argument("--debug","-d", help="to see the processing steps.", action="store_true")
+    parser.add_argument("--debug-dir", help="write the processing steps as images to this directory instead of showing them, works headless and with --batch, --server and --pipeline.")
+    parser.add_argument("--debug-every", help="with --debug-dir, keep the steps of one in this many images. Default: 1",type=check_positive, default=1)
+    parser.add_argument("--server","-s", help="keep running and read line-delimited JSON requests from stdin.", action="store_true")
+    parser.add_argument("--socket", help="with --server, listen on this Unix socket path instead of stdin.")
+    parser.add_argument("--no-warmup", help="with --server, skip the warm-up detection run at startup.", action="store_true")
+    parser.add_argument("--batch","-b", help="directory, glob pattern or manifest file of images to analyse. Results are written as JSON lines.")
+    parser.add_argument("--workers", help="with --batch, number of worker processes, with --pipeline, number of detection threads. Default: number of cores with --batch, 1 with --pipeline",type=check_positive)
+    parser.add_argument("--pyramid","-p", help="search circles on an image this many times smaller, then refine them at full resolution. Default: 1 (off)",type=check_scale, default=1)
+    parser.add_argument("--format", help="output format, one of %s. Default: text, json with --batch" % ", ".join(FORMATS), choices=FORMATS)
+    parser.add_argument("--circle-workers", help="max threads processing the circles or square levels of one image. Default: number of cores, 1 with --batch",type=check_positive)
+    parser.add_argument("--square-levels", help="threshold levels searched for square clocks. Fewer is faster but may miss faint squares. Default: %d" % DEFAULT_LEVELS,type=check_positive, default=DEFAULT_LEVELS)
+    parser.add_argument("--square-min", help="stop the square search once this many agreeing squares are found. Default: search every level",type=check_positive)
+    parser.add_argument("--metrics", help="with --filename or --webcam, also write the stage timers and counts of every image.", action="store_true")
+    parser.add_argument("--cache-size", help="keep the results of this many images in memory and answer repeated images from them. Default: 0 (off)",type=int, default=0)
+    parser.add_argument("--cache-dir", help="also store cached results as files in this directory, kept across runs.")
+    parser.add_argument("--engine","-e", help="hand reader, hough line segments or polar unwrap of the face. Default: hough", choices=ENGINES, default=ENGINE_HOUGH)
+    parser.add_argument("--video","-v", help="webcam index, video file or stream url to track clocks on, one result per frame.")
+    parser.add_argument("--keyframe", help="with --video, frames between two full detections, the others only reread the known clocks. Default: 30",type=check_positive, default=30)
+    parser.add_argument("--pipeline", help="with --video, capture, detect and write frames concurrently instead of tracking, statistics go to stderr.", action="store_true")
+    parser.add_argument("--queue-size", help="with --pipeline, frames waiting for detection at most. Default: 4",type=check_positive, default=4)
+    parser.add_argument("--overload", help="with --pipeline, on a full queue drop the oldest frame or block the capture. Default: drop", choices=("drop", "block"), default="drop")
+    parser.add_argument("--camera", help="id of the fixed camera the images come from: its clocks are read where --registry stored them and only searched for again once they no longer look like clocks.")
+    parser.add_argument("--registry", help="file of the clock positions of fixed cameras, also used by --server requests with a 'camera' field. Default: cameras.json")
+    args = parser.parse_args()
+    options = {"threshold": args.threshold, "workers": args.circle_workers, "pyramid": args.pyramid,
+               "squarelevels": args.square_levels, "squaremin": args.square_min, "engine": args.engine}
+    # the stage images of --debug-dir are written by a background thread, also in batch and server workers
+    debug, headless = args.debug, {}
+    if args.debug_dir is not None:
+        from debugsink import imagesink
+        debug = imagesink(args.debug_dir, args.debug_every)
+        headless["debug"] = debug
+    if args.cache_size > 0 or args.cache_dir is not None:
+        from cache import resultcache
+        options["cache"] = resultcache(max(args.cache_size, 0), args.cache_dir)
+    if args.camera is not None or args.registry is not None:
+        from registry import roiregistry, DEFAULT_REGISTRY
+        options["registry"] = roiregistry(args.registry or DEFAULT_REGISTRY)
+        options["camera"] = args.camera
+    try:
+        run(parser, args, options, debug, headless)
+    finally:
+        if debug:
+            getdebug(debug).close()
 
-        processImage(res[0],args.debug,args.threshold)
+def run(parser, args, options, debug, headless):
+    if args.batch is not None:
+        import batch
+        try:
+            batch.runbatch(args.batch, args.workers, options=dict(options, workers=args.circle_workers or 1, target=args.target_size,
+                                                              refine=args.refine_radius, **headless), fmt=args.format or "json")
+        except ValueError as e:
+            parser.error(str(e))
 
-elif args.filename is not None:
-    img = cv2.imread(args.filename, 0)
+    elif args.server:
+        import worker
+        worker.serve(dict(options, target=args.target_size, refine=args.refine_radius, **headless), socketpath=args.socket, warmup=not args.no_warmup)
+
+    elif args.video is not None and args.pipeline:
+        import json
+        import pipeline
+        source = int(args.video) if args.video.isdigit() else args.video
+        writer = serializer(sys.stdout, args.format or "text")
+        stats = pipeline.runstream(source, lambda frame, results, error: writer.write(results, frame, error), options,
+                                   args.workers or 1, args.queue_size, args.overload, debug=headless.get("debug"))
+        sys.stderr.write(json.dumps(stats) + "\n")
+
+    elif args.video is not None:
+        import tracker
+        source = int(args.video) if args.video.isdigit() else args.video
+        writer = serializer(sys.stdout, args.format or "text")
+        for frame, results in tracker.trackstream(source, options, args.keyframe, debug):
+            writer.write(results, frame)
+
+    elif args.webcam:
+        from webcam import getWebcamImage, ESC_KEY_CODE
+        writer = serializer(sys.stdout, args.format or "text")
+        while True:
+            res = getWebcamImage()
+            if res[1] == ESC_KEY_CODE:
+                break
+
+            metrics = stagemetrics() if args.metrics else None
+            writer.write(processImage(res[0],debug,metrics=metrics,**options), metrics=metrics)
+
+    elif args.raw is not None or args.shm is not None:
+        import frames
+        if args.shape is None:
+            parser.error("--raw and --shm need --shape")
+        metrics = stagemetrics() if args.metrics else None
+        writer = serializer(sys.stdout, args.format or "text")
+        try:
+            if args.raw is not None:
+                results = processImage(frames.mapraw(args.raw, args.shape, offset=args.offset),debug,metrics=metrics,**options)
+            else:
+                with frames.sharedframe(args.shm, args.shape) as frame:
+                    results = processImage(frame.array,debug,metrics=metrics,**options)
+        except (ValueError, OSError) as e:
+            parser.error(str(e))
+        writer.write(results, metrics=metrics)
+
+    elif args.filename is not None:
+        metrics = stagemetrics() if args.metrics else None
+        if args.filename.lower().endswith(".npy"):
+            import frames
+            try:
+                img = frames.mapnpy(args.filename)
+            except (ValueError, OSError) as e:
+                parser.error(str(e))
+            results = processImage(img,debug,metrics=metrics,**options)
+        else:
+            try:
+                results = processFile(args.filename,debug,args.target_size,args.refine_radius,metrics=metrics,**options)
+            except OSError as e:
+                parser.error(str(e))
+
+        if results is not None:
+            serializer(sys.stdout, args.format or "text").write(results, metrics=metrics)
+    else:
+        parser.print_help()
 
-    if img is not None:
-        processImage(img,args.debug,args.threshold)
-else:
-    parser.print_help()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Continuous detection where capture, detection and output overlap, joined by bounded queues"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from interface import processImage
+
+# what a full frame queue does with a new frame: wait for room, or drop the oldest frame waiting
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop"
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST)
+DEFAULT_QUEUE_SIZE = 4
+
+# asyncio queue that applies an overload policy and keeps depth statistics
+class framequeue:
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE, policy=POLICY_BLOCK):
+        if policy not in POLICIES:
+            raise ValueError("unknown overload policy %s" % policy)
+        self._queue = asyncio.Queue(maxsize)
+        self._policy = policy
+        self.puts = 0
+        self.dropped = 0
+        self.maxdepth = 0
+        self._depths = 0
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    # force waits for room whatever the policy, end of stream markers must not be dropped
+    async def put(self, item, force=False):
+        if self._policy == POLICY_DROP_OLDEST and not force:
+            while self._queue.full():
+                self._queue.get_nowait()
+                self.dropped += 1
+            self._queue.put_nowait(item)
+        else:
+            await self._queue.put(item)
+        self.puts += 1
+        self._depths += self._queue.qsize()
+        self.maxdepth = max(self.maxdepth, self._queue.qsize())
+
+    async def get(self):
+        return await self._queue.get()
+
+    def todict(self):
+        return {"maxsize": self._queue.maxsize, "policy": self._policy, "dropped": self.dropped,
+                "maxdepth": self.maxdepth, "meandepth": self._depths / self.puts if self.puts else 0.0}
+
+# counters of one pipeline run
+class pipelinestats:
+    def __init__(self):
+        self.captured = 0
+        self.processed = 0
+        self.failed = 0
+        self._latency = 0.0
+        self.maxlatency = 0.0
+        self._start = time.perf_counter()
+        self._end = None
+
+    def done(self, latency):
+        self.processed += 1
+        self._latency += latency
+        self.maxlatency = max(self.maxlatency, latency)
+
+    def stop(self):
+        self._end = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self._end or time.perf_counter()) - self._start
+
+    # latencies from capture to output in milliseconds, throughputs in frames per second
+    def todict(self, queues=None):
+        elapsed = self.elapsed
+        res = {"captured": self.captured, "processed": self.processed, "failed": self.failed, "elapsed": elapsed,
+               "capturefps": self.captured / elapsed if elapsed else 0.0,
+               "throughput": self.processed / elapsed if elapsed else 0.0,
+               "meanlatency": self._latency / self.processed * 1000 if self.processed else 0.0,
+               "maxlatency": self.maxlatency * 1000}
+        if queues:
+            res["queues"] = dict((name, queue.todict()) for name, queue in queues.items())
+        return res
+
+def _togray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img is not None and img.ndim == 3 else img
+
+# reads and decodes frames on its own thread so a slow detection never holds the capture back
+async def _capture(read, frames, stats, executor, workers, maxframes):
+    loop = asyncio.get_running_loop()
+    frame = 0
+    try:
+        while maxframes is None or frame < maxframes:
+            img = await loop.run_in_executor(executor, read)
+            if img is None:
+                break
+            stats.captured += 1
+            await frames.put((frame, time.perf_counter(), img))
+            frame += 1
+    finally:
+        for _ in range(workers):
+            await frames.put(None, force=True)
+
+async def _detect(detector, frames, results, stats, executor):
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await frames.get()
+        if item is None:
+            await results.put(None)
+            return
+        frame, captured, img = item
+        try:
+            found, error = await loop.run_in_executor(executor, detector, img), None
+        except Exception as e:
+            found, error = [], str(e)
+            stats.failed += 1
+        await results.put((frame, captured, found, error))
+
+async def _output(emit, results, stats, workers):
+    finished = 0
+    while finished < workers:
+        item = await results.get()
+        if item is None:
+            finished += 1
+            continue
+        frame, captured, found, error = item
+        emit(frame, found, error)
+        stats.done(time.perf_counter() - captured)
+
+async def runpipeline(read, emit, detector, workers=1, queuesize=DEFAULT_QUEUE_SIZE, policy=POLICY_DROP_OLDEST, maxframes=None):
+    frames = framequeue(queuesize, policy)
+    # results are never dropped, detections already paid for are always written
+    results = framequeue(queuesize, POLICY_BLOCK)
+    stats = pipelinestats()
+    with ThreadPoolExecutor(1) as capture, ThreadPoolExecutor(workers) as detection:
+        await asyncio.gather(_capture(lambda: _togray(read()), frames, stats, capture, workers, maxframes),
+                             *([_detect(detector, frames, results, stats, detection) for _ in range(workers)] +
+                               [_output(emit, results, stats, workers)]))
+    stats.stop()
+    return stats.todict({"frames": frames, "results": results})
+
+# detects clocks on every frame of a webcam index, video file or stream url. emit(frame, results, error)
+# is called from the event loop in completion order, which with several workers is not always frame order.
+# Returns the throughput and queue depth statistics
+# debug is a debugsink.imagesink or None, debug windows would block the pipeline
+def runstream(source, emit, options=None, workers=1, queuesize=DEFAULT_QUEUE_SIZE, policy=POLICY_DROP_OLDEST, maxframes=None, debug=None):
+    from webcam import webcam
+    options = dict(options or {})
+    options.setdefault("threshold", None)
+    detector = functools.partial(processImage, debug=debug, **options)
+    capture = webcam(source)
+    try:
+        return asyncio.run(runpipeline(capture.read, emit, detector, workers, queuesize, policy, maxframes))
+    finally:
+        capture.release()
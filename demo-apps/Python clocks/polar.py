@@ -0,0 +1,108 @@
+"""Hand finder that reads the clock face unwrapped to polar coordinates.
+
+Each row of the unwrapped face is one angle and each column one distance to the center.
+Hands stand out from the ring of face around them, darker or, on metal hands, lighter.
+They are runs of such pixels starting next to the center, so the length of that run per
+angle peaks at every hand. Tick marks and numbers never reach the center and are skipped.
+"""
+import math
+import cv2
+import numpy as np
+
+# the hub of the hands is not searched, its cap is often lighter than the hands
+HUB = 0.12
+# shortest hand, relative to the radius
+MIN_LENGTH = 0.3
+# light pixels bridged inside a hand, relative to the radius
+MAX_GAP = 0.03
+
+def unwrap(circle, radius):
+    rows = max(360, int(round(2 * math.pi * radius)))
+    return cv2.warpPolar(circle, (radius, rows), (radius, radius), radius, cv2.WARP_POLAR_LINEAR)
+
+# difference of every pixel to the face at the same distance from the center
+def contrast(polar):
+    ring = np.median(polar, axis=0).astype(np.uint8)
+    return cv2.absdiff(polar, np.broadcast_to(ring, polar.shape).copy())
+
+# pixels standing out from their ring, the face itself is the bulk of the histogram
+def handmask(polar):
+    _retval, mask = cv2.threshold(contrast(polar), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_TRIANGLE)
+    return mask
+
+# length of the run of hand pixels leaving the hub for every angle
+def runlengths(mask, radius):
+    gap = max(int(round(radius * MAX_GAP)), 1)
+    dark = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((1, 2 * gap + 1), dtype=np.uint8))
+
+    hub = int(round(radius * HUB))
+    dark = dark[:, hub:] > 0
+    lengths = np.where(dark.all(axis=1), dark.shape[1], np.argmin(dark, axis=1))
+    return np.where(dark[:, 0], lengths + hub, 0)
+
+# [x1, y1, x2, y2] of a hand, tip first, fitted through the pixels of its outer half so
+# a circle center a few pixels off the pivot of the hands barely turns the hand
+def _fithand(rows, lengths, mask, radius, inner):
+    angles = 2 * math.pi * rows / len(lengths)
+    points = []
+    for row, angle, length in zip(rows, angles, lengths[rows]):
+        rho = inner + np.flatnonzero(mask[row, inner:length])
+        points.append(np.column_stack([radius + rho * math.cos(angle), radius + rho * math.sin(angle)]))
+    points = np.concatenate(points).astype(np.float32)
+    if len(points) < 2:
+        return None
+    vx, vy, x0, y0 = cv2.fitLine(points, cv2.DIST_L2, 0, 0.01, 0.01).ravel()
+
+    along = (points[:, 0] - x0) * vx + (points[:, 1] - y0) * vy
+    ends = [(x0 + t * vx, y0 + t * vy) for t in (along.min(), along.max())]
+    ends.sort(key=lambda end: math.hypot(end[0] - radius, end[1] - radius), reverse=True)
+    return [int(round(value)) for end in ends for value in end]
+
+# (line, length, thickness) of every run of angles where a hand leaves the hub
+def findhands(lengths, mask, radius):
+    rows = len(lengths)
+    inside = lengths >= radius * MIN_LENGTH
+    if not inside.any() or inside.all():
+        return []
+
+    # start on an angle without hand so no run wraps around, the padding closes a run
+    # reaching the last angle so every run has both its edges
+    start = np.argmin(inside)
+    edges = np.flatnonzero(np.diff(np.r_[False, np.roll(inside, -start), False].astype(np.int8)))
+    hands = []
+    for first, last in zip(edges[::2], edges[1::2]):
+        run = (np.arange(first, last) + start) % rows
+        length = lengths[run].max()
+        # the hand body is the part of the run reaching half the hand length,
+        # its width half way along the hand is the thickness
+        body = run[lengths[run] >= length / 2]
+        thickness = len(body) * 2 * math.pi / rows * length / 2
+        line = _fithand(body, lengths, mask, radius, int(length // 2))
+        if line is not None:
+            hands.append((line, length, thickness))
+    return hands
+
+# hand lines, tip first, as (hours, minutes, seconds) like clockhandler._calcpointers
+def findpointers(circle, radius):
+    radius = int(radius)
+    mask = handmask(unwrap(circle, radius))
+    hands = findhands(runlengths(mask, radius), mask, radius)
+    if not hands:
+        return None
+
+    # the largest runs are the hands, the rest is clutter touching the hub
+    hands = sorted(hands, key=lambda hand: hand[1] * hand[2], reverse=True)[:3]
+
+    # hours and minutes hands overlap
+    if len(hands) == 1:
+        return (hands[0][0], hands[0][0], None)
+
+    seconds = None
+    if len(hands) == 3:
+        # the thinnest hand counts seconds
+        seconds = min(hands, key=lambda hand: hand[2])
+        hands.remove(seconds)
+        seconds = seconds[0]
+
+    hours, minutes = sorted(hands, key=lambda hand: hand[1])
+    return (hours[0], minutes[0], seconds)
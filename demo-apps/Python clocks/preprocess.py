@@ -0,0 +1,40 @@
+"""Per-image cache of the preprocessed images shared by the circle and square detectors"""
+import threading
+import cv2
+
+# builds each intermediate image the first time a detector asks for it, then hands out the same array.
+# Cached images are shared, callers must copy before drawing on them
+class imagecontext:
+    def __init__(self, img):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        self.gray = img
+        self._cache = {}
+        # detectors running on threads may ask for the same image at once
+        self._lock = threading.Lock()
+
+    def _cached(self, key, function, *args):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = function(*args)
+            return self._cache[key]
+
+    @property
+    def shape(self):
+        return self.gray.shape
+
+    # input of the circle search
+    def median(self):
+        return self._cached("median", cv2.medianBlur, self.gray, 3)
+
+    # input of the square search
+    def gaussian(self):
+        return self._cached("gaussian", cv2.GaussianBlur, self.gray, (5, 5), 0)
+
+    # Canny of one of median, gaussian or gray
+    def edges(self, source, low, high, aperture=3):
+        img = self.gray if source == "gray" else getattr(self, source)()
+        return self._cached(("edges", source, low, high, aperture), cv2.Canny, img, low, high, None, aperture)
+
+def getcontext(img):
+    return img if isinstance(img, imagecontext) else imagecontext(img)
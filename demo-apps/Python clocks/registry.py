@@ -0,0 +1,144 @@
+"""Clock positions of fixed cameras kept across runs, their frames are read without searching for the clocks"""
+import contextlib
+import json
+import os
+import threading
+try:
+    import fcntl
+except ImportError:
+    # no lock between processes, parallel writers may lose each other's updates
+    fcntl = None
+from clockhandler import ENGINE_HOUGH
+from results import STATUS_OK
+from tracker import readclocks, DEFAULT_SUPPORT
+
+DEFAULT_REGISTRY = "cameras.json"
+
+# camera id -> frame shape and kind, center and radius of its clocks, in one json file:
+# {"cameras": {"gate": {"shape": [480, 640], "clocks": [{"kind": "circle", "center": [320, 200], "radius": 90}]}}}
+# The file is read again when another process replaced it, and updated under a lock on path + ".lock"
+# so batch workers and servers sharing it keep each other's cameras. Clocks that appear next to the stored
+# ones are only found once a stored one is lost and the camera is located again
+class roiregistry:
+    def __init__(self, path=DEFAULT_REGISTRY, minsupport=DEFAULT_SUPPORT):
+        self._path = path
+        self._minsupport = minsupport
+        self._cameras = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.updates = 0
+
+    # worker processes get the same file and load it on their first frame
+    def __getstate__(self):
+        return {"path": self._path, "minsupport": self._minsupport}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["minsupport"])
+
+    def _reload(self, force=False):
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except OSError:
+            self._cameras, self._mtime = {}, None
+            return
+        if mtime == self._mtime and not force:
+            return
+        try:
+            with open(self._path) as f:
+                self._cameras = json.load(f).get("cameras", {})
+        except ValueError:
+            self._cameras = {}
+        self._mtime = mtime
+
+    # held from reading the file to replacing it, other processes wait for their update
+    @contextlib.contextmanager
+    def _update(self):
+        with self._lock:
+            if fcntl is None:
+                self._reload(force=True)
+                yield
+                return
+            with open(self._path + ".lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    self._reload(force=True)
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _save(self):
+        # written aside then renamed so readers never see half a file
+        temp = self._path + ".%d.tmp" % os.getpid()
+        with open(temp, "w") as f:
+            json.dump({"cameras": self._cameras}, f, indent=1, sort_keys=True)
+        os.replace(temp, self._path)
+        self._mtime = os.stat(self._path).st_mtime_ns
+        self.updates += 1
+
+    def cameras(self):
+        with self._lock:
+            self._reload()
+            return sorted(self._cameras)
+
+    # {"shape": [height, width], "clocks": [...]} of camera, None when it has none stored
+    def get(self, camera):
+        with self._lock:
+            self._reload()
+            entry = self._cameras.get(str(camera))
+            return json.loads(json.dumps(entry)) if entry is not None else None
+
+    # whether the entry of camera differs from entry in the file as last read, the file lock is only
+    # taken for an actual update, not on every frame of a camera showing no readable clock
+    def _changes(self, camera, entry):
+        with self._lock:
+            self._reload()
+            return self._cameras.get(str(camera)) != entry
+
+    # stores the clocks read OK in results of a frame of shape, or forgets camera when there are none
+    def put(self, camera, shape, results):
+        clocks = [{"kind": result.kind, "center": [int(value) for value in result.center], "radius": int(result.radius)}
+                  for result in results if result.status == STATUS_OK]
+        entry = {"shape": list(shape[:2]), "clocks": clocks} if clocks else None
+        if not self._changes(camera, entry):
+            return
+        with self._update():
+            # another process may have written the same entry since
+            if self._cameras.get(str(camera)) == entry:
+                return
+            if entry is None:
+                del self._cameras[str(camera)]
+            else:
+                self._cameras[str(camera)] = entry
+            self._save()
+
+    def remove(self, camera):
+        if not self._changes(camera, None):
+            return
+        with self._update():
+            if self._cameras.pop(str(camera), None) is not None:
+                self._save()
+
+    # results of the stored clocks of camera read on an imagecontext, None when there are none for frames
+    # of its size or one of them no longer looks like a clock: out of the frame, rim gone or unreadable
+    def read(self, camera, context, engine=ENGINE_HOUGH, debug=None):
+        entry = self.get(camera)
+        if entry is None or tuple(entry["shape"]) != context.gray.shape[:2]:
+            with self._lock:
+                self.misses += 1
+            return None
+        clocks = [(clock["kind"], tuple(clock["center"]), clock["radius"]) for clock in entry["clocks"]]
+        results = readclocks(context, clocks, engine, self._minsupport, debug)
+        with self._lock:
+            if results is None:
+                self.stale += 1
+            else:
+                self.hits += 1
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"cameras": len(self._cameras), "hits": self.hits, "misses": self.misses,
+                    "stale": self.stale, "updates": self.updates}
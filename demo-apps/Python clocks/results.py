@@ -0,0 +1,134 @@
+"""Clock detection results and the serializer that writes them"""
+import csv
+import json
+
+STATUS_OK = "ok"
+STATUS_OUT_OF_BOUNDS = "outofbounds"
+STATUS_NO_LINES = "nolines"
+STATUS_TOO_MANY_LINES = "toomanylines"
+STATUS_NO_CLOCK = "noclock"
+STATUS_ERROR = "error"
+
+KIND_CIRCLE = "circle"
+KIND_SQUARE = "square"
+
+HANDS = ("hours", "minutes", "seconds")
+FORMATS = ("text", "json", "csv")
+
+CSV_FIELDS = ["source", "clock", "kind", "status", "center_x", "center_y", "radius", "h", "m", "s",
+              "hours_x", "hours_y", "minutes_x", "minutes_y", "seconds_x", "seconds_y", "threshold", "error"]
+
+_MESSAGES = {
+    STATUS_OUT_OF_BOUNDS: "Circle partially outside of the image, skipped",
+    STATUS_NO_LINES: "No hands found on the clock",
+    STATUS_TOO_MANY_LINES: "Too many lines found on the clock",
+    STATUS_NO_CLOCK: "No clocks detected on image!",
+}
+
+class clockresult:
+    __slots__ = ("status", "kind", "center", "radius", "hands", "time", "threshold")
+
+    # hands maps hours/minutes/seconds to the tip of each detected hand. threshold is the rim
+    # support cutoff the auto circle threshold chose, None when a fixed threshold was used
+    def __init__(self, status, kind=KIND_CIRCLE, center=None, radius=None, hands=None, time=None, threshold=None):
+        self.status = status
+        self.kind = kind
+        self.center = tuple(int(value) for value in center) if center is not None else None
+        self.radius = int(radius) if radius is not None else None
+        self.hands = hands or {}
+        self.time = time
+        self.threshold = threshold
+
+    # results are built on the clock crop, this places them on the full image
+    def moveto(self, center):
+        dx = int(center[0]) - self.radius
+        dy = int(center[1]) - self.radius
+        self.center = (int(center[0]), int(center[1]))
+        self.hands = dict((name, (tip[0] + dx, tip[1] + dy)) for name, tip in self.hands.items())
+        return self
+
+    # results found on an image decoded factor times smaller, placed on the full size one
+    def scale(self, factor):
+        if factor != 1:
+            self.center = tuple(int(round(value * factor)) for value in self.center) if self.center is not None else None
+            self.radius = int(round(self.radius * factor)) if self.radius is not None else None
+            self.hands = dict((name, (int(round(tip[0] * factor)), int(round(tip[1] * factor)))) for name, tip in self.hands.items())
+        return self
+
+    def todict(self):
+        res = {
+            "kind": self.kind,
+            "status": self.status,
+            "center": list(self.center) if self.center is not None else None,
+            "radius": self.radius,
+            "hands": dict((name, list(tip)) for name, tip in self.hands.items()),
+            "h": None, "m": None, "s": None,
+        }
+        if self.time is not None:
+            res["h"], res["m"], res["s"] = self.time
+        if self.threshold is not None:
+            res["threshold"] = self.threshold
+        return res
+
+    @classmethod
+    def fromdict(cls, data):
+        time = None
+        if data.get("h") is not None:
+            time = (data["h"], data["m"], data["s"])
+        center = tuple(data["center"]) if data.get("center") is not None else None
+        hands = dict((name, tuple(tip)) for name, tip in data.get("hands", {}).items())
+        return cls(data["status"], data.get("kind", KIND_CIRCLE), center, data.get("radius"), hands, time, data.get("threshold"))
+
+def formattime(time):
+    return "%02d:%02d:%02d" % tuple(time)
+
+# writes every result of an image through one of FORMATS, json is one line per image.
+# Stage metrics go in a json field or a text line, csv rows have no room for them
+class serializer:
+    def __init__(self, stream, fmt="text"):
+        if fmt not in FORMATS:
+            raise ValueError("unknown output format %s" % fmt)
+        self._stream = stream
+        self._fmt = fmt
+        self._csv = None
+
+    def write(self, results, source=None, error=None, metrics=None):
+        getattr(self, "_write" + self._fmt)(results, source, error, metrics.todict() if metrics is not None else None)
+        self._stream.flush()
+
+    def _writetext(self, results, source, error, metrics):
+        prefix = "%s: " % source if source is not None else ""
+        if error is not None:
+            self._stream.write(prefix + "Error: %s\n" % error)
+        for result in results:
+            if result.status == STATUS_OK:
+                self._stream.write(prefix + "Time: " + formattime(result.time) + "\n")
+            else:
+                self._stream.write(prefix + _MESSAGES[result.status] + "\n")
+        thresholds = set(result.threshold for result in results if result.threshold is not None)
+        if thresholds:
+            self._stream.write(prefix + "Circle threshold: auto, rim support %s\n" % ", ".join("%.2f" % t for t in sorted(thresholds)))
+        if metrics is not None:
+            self._stream.write(prefix + "Metrics: " + json.dumps(metrics) + "\n")
+
+    def _writejson(self, results, source, error, metrics):
+        res = {"source": source, "clocks": [result.todict() for result in results], "error": error}
+        if metrics is not None:
+            res["metrics"] = metrics
+        self._stream.write(json.dumps(res) + "\n")
+
+    def _writecsv(self, results, source, error, metrics):
+        if self._csv is None:
+            self._csv = csv.DictWriter(self._stream, CSV_FIELDS)
+            self._csv.writeheader()
+        if error is not None:
+            self._csv.writerow({"source": source, "status": STATUS_ERROR, "error": error})
+        for index, result in enumerate(results):
+            row = result.todict()
+            row.update({"source": source, "clock": index})
+            center = row.pop("center")
+            if center is not None:
+                row["center_x"], row["center_y"] = center
+            for name, tip in row.pop("hands").items():
+                row[name + "_x"], row[name + "_y"] = tip
+            self._csv.writerow(row)
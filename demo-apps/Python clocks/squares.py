@@ -1,40 +1,120 @@
+import math
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
 from angles import angle_between_lines
-from clockhandler import clockhandler
+from debugsink import getdebug
+from clockhandler import clockhandler, ENGINE_HOUGH
+from instrument import getmetrics
+from preprocess import getcontext
+from results import KIND_SQUARE
 
+# threshold levels searched by default, Canny being the first one
+DEFAULT_LEVELS = 10
+MIN_SQUARE_AREA = 1000
 
 class squares:
-    def __init__(self, img, debug=False):
-        self._img = img
-        self._debug = debug
-        self._MAX_X = img.shape[1]
-        self._MAX_Y = img.shape[0]
+    # img: grayscale image or the imagecontext shared with the circle search
+    # levels: threshold levels searched
+    # minsquares: stop searching once that many agreeing squares passed the filter, None searches every level
+    # workers: threads searching levels side by side, None uses one per core
+    # engine: hand reader of the clockhandler reading the square
+    # metrics: instrument.metrics filled with stage timers and counts, None disables it
+    # debug: True shows the stages in windows, a debugsink sink collects them
+    def __init__(self, img, debug=False, levels=DEFAULT_LEVELS, minsquares=None, workers=None, engine=ENGINE_HOUGH, metrics=None):
+        self._context = getcontext(img)
+        self._img = self._context.gray
+        self._debug = getdebug(debug)
+        self._MAX_X = self._img.shape[1]
+        self._MAX_Y = self._img.shape[0]
+        self._levels = levels
+        self._minsquares = minsquares
+        self._workers = workers
+        self._engine = engine
+        self._metrics = getmetrics(metrics)
+        self._corner_threshold = int(0.05*(self._MAX_X+self._MAX_Y)/2)
+        self._x_y_delta = int(0.03*(self._MAX_X+self._MAX_Y)/2)
 
     def _angle_cos(self, p0, p1, p2):
         d1, d2 = (p0-p1).astype('float'), (p2-p1).astype('float')
         return abs( np.dot(d1, d2) / np.sqrt( np.dot(d1, d1)*np.dot(d2, d2) ) )
 
-    def _findsquares(self,img):
-        img = cv2.GaussianBlur(img, (5, 5), 0)
+    # levels thresholds a whole step apart, 0, 26 ... 234 for the default 10. Where rounding the step up
+    # leaves fewer, they are spaced evenly instead; fewer only when more are asked for than there are gray values
+    def _thresholds(self):
+        thresholds = list(range(0, 255, int(math.ceil(255 / self._levels))))
+        if len(thresholds) == self._levels:
+            return thresholds
+        return [int(thrs) for thrs in np.unique(np.linspace(0, 255, self._levels, endpoint=False).astype(int))]
+
+    # contours that cannot give a square kept by _filtersquares: too small, or reaching so close to the
+    # border that the approximated polygon (within eps of the contour) has a corner inside the margin
+    def _prunecontour(self, cnt, eps):
+        x, y, w, h = cv2.boundingRect(cnt)
+        if w * h <= MIN_SQUARE_AREA:
+            return True
+        margin = self._corner_threshold - eps
+        return (x < margin or y < margin or x + w - 1 > self._MAX_X - margin
+                or y + h - 1 > self._MAX_Y - margin)
+
+    def _findlevelsquares(self, thrs):
+        if thrs == 0:
+            bin = self._context.edges("gaussian", 0, 50, aperture=5)
+            bin = cv2.dilate(bin, None)
+        else:
+            _retval, bin = cv2.threshold(self._context.gaussian(), thrs, 255, cv2.THRESH_BINARY)
+
+        # OpenCV 3 returns (image, contours, hierarchy), OpenCV 4 (contours, hierarchy)
+        contours = cv2.findContours(bin, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[-2]
+        self._metrics.count("squarecontours_%03d" % thrs, len(contours))
         squares = []
-        for gray in cv2.split(img):
-            for thrs in range(0, 255, 26):
-                if thrs == 0:
-                    bin = cv2.Canny(gray, 0, 50, apertureSize=5)
-                    bin = cv2.dilate(bin, None)
-                else:
-                    _retval, bin = cv2.threshold(gray, thrs, 255, cv2.THRESH_BINARY)
-
-                bin, contours, _hierarchy = cv2.findContours(bin, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-                for cnt in contours:
-                    cnt_len = cv2.arcLength(cnt, True)
-                    cnt = cv2.approxPolyDP(cnt, 0.02*cnt_len, True)
-                    if len(cnt) == 4 and cv2.contourArea(cnt) > 1000 and cv2.isContourConvex(cnt):
-                        cnt = cnt.reshape(-1, 2)
-                        max_cos = np.max([self._angle_cos( cnt[i], cnt[(i+1) % 4], cnt[(i+2) % 4] ) for i in range(4)])
-                        if max_cos < 0.1:
-                            squares.append(cnt)
+        for cnt in contours:
+            cnt_len = cv2.arcLength(cnt, True)
+            if self._prunecontour(cnt, 0.02*cnt_len):
+                continue
+            cnt = cv2.approxPolyDP(cnt, 0.02*cnt_len, True)
+            if len(cnt) == 4 and cv2.contourArea(cnt) > MIN_SQUARE_AREA and cv2.isContourConvex(cnt):
+                cnt = cnt.reshape(-1, 2)
+                max_cos = np.max([self._angle_cos( cnt[i], cnt[(i+1) % 4], cnt[(i+2) % 4] ) for i in range(4)])
+                if max_cos < 0.1:
+                    squares.append(cnt)
+        return squares
+
+    # squares that passed the filter and whose centers sit together
+    def _agreeing(self, good_squares):
+        if not good_squares:
+            return 0
+        centers = np.array([square.mean(axis=0) for square in good_squares])
+        median = np.median(centers, axis=0)
+        return np.count_nonzero(np.hypot(*(centers - median).T) <= self._x_y_delta)
+
+    def _enough(self, squares):
+        return self._minsquares is not None and self._agreeing(self._filtersquares(squares)) >= self._minsquares
+
+    def _findsquares(self):
+        jobs = list(self._thresholds())
+        squares = []
+        with self._metrics.stage("gaussian"):
+            self._context.gaussian()
+
+        workers = min(self._workers or multiprocessing.cpu_count(), len(jobs))
+        if workers <= 1:
+            for thrs in jobs:
+                squares += self._findlevelsquares(thrs)
+                if self._enough(squares):
+                    break
+            return squares
+
+        # levels are collected in their original order so the early exit stays deterministic
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._findlevelsquares, thrs) for thrs in jobs]
+            for future in futures:
+                squares += future.result()
+                if self._enough(squares):
+                    for pending in futures:
+                        pending.cancel()
+                    break
         return squares
 
     def _distance(self,v1,v2): 
@@ -43,8 +123,8 @@ class squares:
 
     def _filtersquares(self,squares):
         good_squares = []
-        corner_threshold = int(0.05*(self._MAX_X+self._MAX_Y)/2)
-        x_y_delta = int(0.03*(self._MAX_X+self._MAX_Y)/2)
+        corner_threshold = self._corner_threshold
+        x_y_delta = self._x_y_delta
 
         # Margin Thresholds
         tlt = [corner_threshold, corner_threshold]
@@ -156,31 +236,30 @@ class squares:
 
     def _process_square(self):
 
-        all_squares = self._findsquares(self._img)
+        with self._metrics.stage("squares"):
+            all_squares = self._findsquares()
+        self._metrics.count("squarecandidates", len(all_squares))
         if(self._debug):
             copy = self._img.copy()
             cv2.drawContours(copy,all_squares,-1,(0,255,0),3)
-            cv2.imshow('Detected Squares', copy)
-            cv2.waitKey(0)
+            self._debug.show('Detected Squares', copy)
 
 
         good_squares = self._filtersquares(all_squares)
+        self._metrics.count("goodsquares", len(good_squares))
         if(self._debug):
             copy = self._img.copy()
             cv2.drawContours(copy,good_squares,-1,(0,255,0),3)
-            cv2.imshow('Filtered Squares', copy)
-            cv2.waitKey(0)
+            self._debug.show('Filtered Squares', copy)
 
         if not good_squares:
-            print("No Square clocks detected on image!\n")
             return []
 
         avg_square = self._findaveragesquare(good_squares)
         if(self._debug):
             copy = self._img.copy()
             cv2.drawContours(copy,[avg_square],-1,(0,255,0),3)
-            cv2.imshow('Average Squares', copy)
-            cv2.waitKey(0)
+            self._debug.show('Average Squares', copy)
 
         # Draw circle in center of the Avg square
         xc =  int(round(avg_square[0][0] + (avg_square[1][0] - avg_square[0][0]) / 2))
@@ -190,14 +269,14 @@ class squares:
         midpoint = np.array((xc,avg_square[0][1]))
         radius =  int(self._distance(center,midpoint))
     
-        # Cropping circle from original image
-        circle = self._img[yc - radius:yc + radius, xc - radius:xc + radius].copy()
+        # Cropping circle from original image, a view as the clockhandler never writes to it
+        circle = self._img[yc - radius:yc + radius, xc - radius:xc + radius]
 
         if(self._debug):
-            cv2.imshow("Cropped",circle)
-            cv2.waitKey(0)
-            cv2.destroyAllWindows()
+            self._debug.show("Cropped", circle)
 
         # Process circle using the clockhandler class
-        ch = clockhandler(circle,debug = self._debug)
-        ch._processcircle(circle,radius)
+        ch = clockhandler(self._context,debug = self._debug,engine = self._engine,metrics = self._metrics)
+        result = ch._processcircle(circle,radius).moveto((xc, yc))
+        result.kind = KIND_SQUARE
+        return [result]
@@ -0,0 +1,148 @@
+"""Renders labelled synthetic clock images for load tests and accuracy sweeps"""
+import argparse
+import json
+import math
+import os
+import random
+import cv2
+import numpy as np
+from cases import DEFAULT_TOLERANCE
+from results import KIND_CIRCLE, KIND_SQUARE
+
+KINDS = (KIND_CIRCLE, KIND_SQUARE)
+FACE = 235
+INK = 20
+
+# tip of a hand turned angle radians clockwise from 12
+def _tip(center, length, angle):
+    return (int(round(center[0] + length * math.sin(angle))), int(round(center[1] - length * math.cos(angle))))
+
+def drawhand(img, center, length, angle, thickness):
+    cv2.line(img, center, _tip(center, length, angle), INK, thickness, cv2.LINE_AA)
+
+def drawticks(img, center, radius, thickness):
+    for i in range(60):
+        angle = 2 * math.pi * i / 60
+        inner = 0.82 if i % 5 == 0 else 0.9
+        cv2.line(img, _tip(center, radius * inner, angle), _tip(center, radius * 0.95, angle), INK,
+                 thickness if i % 5 == 0 else 1, cv2.LINE_AA)
+
+# draws a clock showing time = (h, m, s) on a grayscale image, the hour and minute hands
+# sit between the marks like on a real movement
+def drawclock(img, center, radius, time, kind=KIND_CIRCLE, thickness=3, ticks=True):
+    h, m, s = time
+    rim = max(2, radius // 20)
+    if kind == KIND_SQUARE:
+        cv2.rectangle(img, (center[0] - radius, center[1] - radius), (center[0] + radius, center[1] + radius), FACE, -1)
+        cv2.rectangle(img, (center[0] - radius, center[1] - radius), (center[0] + radius, center[1] + radius), INK, rim)
+    else:
+        cv2.circle(img, center, radius, FACE, -1, cv2.LINE_AA)
+        cv2.circle(img, center, radius, INK, rim, cv2.LINE_AA)
+    if ticks:
+        drawticks(img, center, radius - rim, max(1, thickness - 1))
+
+    drawhand(img, center, radius * 0.5, 2 * math.pi * ((h % 12) + m / 60) / 12, thickness * 2)
+    drawhand(img, center, radius * 0.8, 2 * math.pi * (m + s / 60) / 60, thickness)
+    drawhand(img, center, radius * 0.88, 2 * math.pi * s / 60, max(1, thickness // 2))
+    cv2.circle(img, center, thickness * 2, INK, -1, cv2.LINE_AA)
+
+# random lines, boxes and rings under the clocks
+def drawclutter(img, count, rng):
+    height, width = img.shape[:2]
+    for _ in range(count):
+        color = rng.randrange(256)
+        shape = rng.randrange(3)
+        x, y = rng.randrange(width), rng.randrange(height)
+        size = rng.randrange(5, max(6, min(width, height) // 4))
+        if shape == 0:
+            cv2.line(img, (x, y), (rng.randrange(width), rng.randrange(height)), color, rng.randrange(1, 4))
+        elif shape == 1:
+            cv2.rectangle(img, (x, y), (x + size, y + size), color, rng.choice([-1, 1, 2]))
+        else:
+            cv2.circle(img, (x, y), size // 2, color, rng.choice([-1, 1, 2]))
+
+def randomtime(rng):
+    return (rng.randrange(12), rng.randrange(60), rng.randrange(60))
+
+# clocks placed so they neither overlap nor leave the image, fewer if they do not fit
+def _place(width, height, count, minradius, maxradius, rng, tries=100):
+    placed = []
+    for _ in range(count):
+        for _ in range(tries):
+            radius = rng.randint(minradius, maxradius)
+            if 2 * radius + 2 > min(width, height):
+                continue
+            center = (rng.randint(radius + 1, width - radius - 1), rng.randint(radius + 1, height - radius - 1))
+            if all(math.hypot(center[0] - other[0][0], center[1] - other[0][1]) > 1.5 * (radius + other[1]) for other in placed):
+                placed.append((center, radius))
+                break
+    return placed
+
+# one frame and the label of every clock on it
+def makeimage(width, height, rng, clocks=1, kind=KIND_CIRCLE, thickness=3, clutter=0, noise=0, ticks=True):
+    img = np.full((height, width), rng.randrange(60, 200), dtype=np.uint8)
+    drawclutter(img, clutter, rng)
+
+    short = min(width, height)
+    labels = []
+    for center, radius in _place(width, height, clocks, int(short * 0.15), int(short * 0.4) if clocks == 1 else int(short * 0.25), rng):
+        clockkind = rng.choice(KINDS) if kind == "mixed" else kind
+        time = randomtime(rng)
+        drawclock(img, center, radius, time, clockkind, thickness, ticks)
+        labels.append({"kind": clockkind, "center": list(center), "radius": radius, "h": time[0], "m": time[1], "s": time[2]})
+
+    if noise:
+        gauss = np.random.RandomState(rng.randrange(2 ** 31)).normal(0, noise, img.shape)
+        img = np.clip(img + gauss, 0, 255).astype(np.uint8)
+    return img, labels
+
+# writes count images and a testcases.json style manifest, cases take the time of their first clock
+def generate(outdir, count, width=640, height=480, seed=0, quality=90, **options):
+    rng = random.Random(seed)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    cases = []
+    for index in range(count):
+        img, labels = makeimage(width, height, rng, **options)
+        name = "synth_%05d.jpg" % index
+        cv2.imwrite(os.path.join(outdir, name), img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        case = {"file": name, "clocks": labels}
+        if labels:
+            case.update(h=labels[0]["h"], m=labels[0]["m"], s=labels[0]["s"])
+        cases.append(case)
+
+    manifest = os.path.join(outdir, "manifest.json")
+    with open(manifest, "w") as f:
+        json.dump({"tolerance": DEFAULT_TOLERANCE, "cases": [case for case in cases if "h" in case]}, f, indent=1)
+    return manifest
+
+def _size(value):
+    try:
+        width, height = [int(part) for part in value.lower().split("x")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a WIDTHxHEIGHT size" % value)
+    return width, height
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic labelled clock images.")
+    parser.add_argument("--output","-o", help="directory to write the images and manifest.json to.", required=True)
+    parser.add_argument("--count","-n", help="number of images. Default: 100", type=int, default=100)
+    parser.add_argument("--size", help="image size as WIDTHxHEIGHT. Default: 640x480", type=_size, default=(640, 480))
+    parser.add_argument("--kind", help="clock shape. Default: circle", choices=KINDS + ("mixed",), default=KIND_CIRCLE)
+    parser.add_argument("--clocks", help="clocks per image. Default: 1", type=int, default=1)
+    parser.add_argument("--thickness", help="minutes hand thickness in pixels, hours is twice it. Default: 3", type=int, default=3)
+    parser.add_argument("--clutter", help="random shapes drawn in the background. Default: 0", type=int, default=0)
+    parser.add_argument("--noise", help="standard deviation of the gaussian noise added. Default: 0", type=float, default=0)
+    parser.add_argument("--no-ticks", help="draw faces without tick marks.", action="store_true")
+    parser.add_argument("--quality","-q", help="JPEG quality. Default: 90", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = generate(args.output, args.count, args.size[0], args.size[1], seed=args.seed, quality=args.quality,
+                        clocks=args.clocks, kind=args.kind, thickness=args.thickness, clutter=args.clutter,
+                        noise=args.noise, ticks=not args.no_ticks)
+    print("Wrote {} images and {}".format(args.count, manifest))
+
+if __name__ == "__main__":
+    main()
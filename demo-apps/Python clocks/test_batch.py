@@ -0,0 +1,54 @@
+"""Checks that repeated images are answered from the result cache, in one process and in batch workers"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import cv2
+from batch import runbatch
+from cache import resultcache
+from interface import processImage
+
+IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "7.jpg")
+
+def test_repeated_image_from_memory():
+    cache = resultcache(8)
+    img = cv2.imread(IMAGE, 0)
+    first = processImage(img, False, None, workers=1, cache=cache)
+    second = processImage(img, False, None, workers=1, cache=cache)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1, cache.stats()
+    assert [result.todict() for result in first] == [result.todict() for result in second]
+
+def _batch(manifest, directory):
+    out = io.StringIO()
+    runbatch(manifest, 1, options={"threshold": None, "workers": 1, "cache": resultcache(8, directory)}, out=out)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+def test_batch_from_cache_dir():
+    directory = tempfile.mkdtemp()
+    try:
+        manifest = os.path.join(directory, "images.txt")
+        with open(manifest, "w") as f:
+            f.write("\n".join([IMAGE] * 3))
+        cachedir = os.path.join(directory, "cache")
+
+        records = _batch(manifest, cachedir)
+        assert len(records) == 3 and all(record["clocks"][0]["status"] == "ok" for record in records)
+        files = os.listdir(cachedir)
+        assert len(files) == 1, files
+
+        # a changed entry shows up in every result only if they all come from the cache
+        path = os.path.join(cachedir, files[0])
+        with open(path) as f:
+            entry = json.load(f)
+        entry[0]["h"] = 7
+        with open(path, "w") as f:
+            json.dump(entry, f)
+        assert [record["clocks"][0]["h"] for record in _batch(manifest, cachedir)] == [7, 7, 7]
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    test_repeated_image_from_memory()
+    test_batch_from_cache_dir()
+    print("result cache: ok")
@@ -0,0 +1,88 @@
+"""Clock tracking over video frames: full detection on keyframes, clock regions only in between"""
+import geometry
+from clockhandler import clockhandler, ENGINE_HOUGH
+from debugsink import getdebug
+from interface import processImage
+from preprocess import getcontext
+from results import KIND_CIRCLE, STATUS_OK
+
+# frames tracked between two full detections by default
+DEFAULT_KEYFRAME = 30
+# fraction of the tracked circle that must still lie on edges
+DEFAULT_SUPPORT = 0.5
+SUPPORT_SAMPLES = 64
+
+class clocktracker:
+    # options are the processImage keyword arguments used on keyframes
+    def __init__(self, options=None, keyframe=DEFAULT_KEYFRAME, minsupport=DEFAULT_SUPPORT):
+        self._options = dict(options or {})
+        self._options.setdefault("threshold", None)
+        self._keyframe = keyframe
+        self._minsupport = minsupport
+        # (kind, center, radius) of the clocks read on the last keyframe
+        self._clocks = []
+        self._sincekey = 0
+        self.frames = 0
+        self.keyframes = 0
+
+    # debug is True for windows or a debugsink sink, sampled per frame
+    def process(self, img, debug=False):
+        context = getcontext(img)
+        debug = getdebug(debug)
+        if debug is not None:
+            debug = debug.request()
+        self.frames += 1
+        if self._clocks and self._sincekey < self._keyframe:
+            results = self._track(context, debug)
+            if results is not None:
+                self._sincekey += 1
+                return results
+        return self._detect(context, debug)
+
+    def _detect(self, context, debug):
+        results = processImage(context, debug, **self._options)
+        self.keyframes += 1
+        self._sincekey = 0
+        self._clocks = [(result.kind, result.center, result.radius) for result in results if result.status == STATUS_OK]
+        return results
+
+    # None once any clock is lost, which asks for a full detection
+    def _track(self, context, debug):
+        return readclocks(context, self._clocks, self._options.get("engine", ENGINE_HOUGH), self._minsupport, debug)
+
+# results of clocks already located, given as (kind, center, radius), read on their regions only.
+# None as soon as one of them left the image, lost its rim or could not be read
+def readclocks(context, clocks, engine=ENGINE_HOUGH, minsupport=DEFAULT_SUPPORT, debug=None):
+    ch = clockhandler(context, debug=debug, workers=1, engine=engine)
+    results = []
+    for kind, center, radius in clocks:
+        # circles are read on the blurred image, squares on the original one
+        img = context.median() if kind == KIND_CIRCLE else context.gray
+        x, y = center
+        if x - radius < 0 or y - radius < 0 or x + radius > img.shape[1] or y + radius > img.shape[0]:
+            return None
+        if kind == KIND_CIRCLE and geometry.rimsupport(img, center, radius, SUPPORT_SAMPLES) < minsupport:
+            return None
+
+        result = ch._processcrop(img[y - radius:y + radius, x - radius:x + radius], radius, center)
+        if result.status != STATUS_OK:
+            return None
+        result.kind = kind
+        results.append(result)
+    return results
+
+# yields (frame number, results) for every frame of a webcam index, video file or stream url
+def trackstream(source, options=None, keyframe=DEFAULT_KEYFRAME, debug=False):
+    from webcam import webcam
+    capture = webcam(source)
+    tracker = clocktracker(options, keyframe)
+    try:
+        frame = 0
+        while True:
+            img = capture.read()
+            if img is None:
+                break
+            yield frame, tracker.process(img, debug)
+            frame += 1
+    finally:
+        capture.release()
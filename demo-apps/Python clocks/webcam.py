@@ -1,10 +1,41 @@
 import cv2
 
-webcam = cv2.VideoCapture(0)
 ESC_KEY_CODE = 27
+
+class webcam:
+    def __init__(self, source=0):
+        self._source = source
+        self._capture = None
+
+    # the device is only opened on the first read
+    def _open(self):
+        if self._capture is None:
+            self._capture = cv2.VideoCapture(self._source)
+        return self._capture
+
+    def isopened(self):
+        return self._capture is not None and self._capture.isOpened()
+
+    def read(self):
+        ret, img = self._open().read()
+        return img if ret else None
+
+    def release(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+_default = None
+
 def getWebcamImage():
+    global _default
+    if _default is None:
+        _default = webcam()
+
     while True:
-        ret, img = webcam.read()
+        img = _default.read()
+        if img is None:
+            return (None, ESC_KEY_CODE)
         img_c = img.copy()
         cv2.putText(img_c,"Press any key to take a frame.",(15, 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
         cv2.putText(img_c,"Press ESC to exit.",(15, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
@@ -0,0 +1,188 @@
+"""Long-lived detection worker that answers line-delimited JSON requests"""
+import base64
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import cv2
+import numpy as np
+import decode
+import frames
+from instrument import metrics as stagemetrics
+from interface import processImage, processFile
+
+SHUTDOWN = "shutdown"
+PING = "ping"
+
+class _stopflag:
+    def __init__(self):
+        self.stopped = False
+        self.busy = False
+
+    # signal handler: finish the request being processed, exit right away when idle
+    def set(self, *args):
+        self.stopped = True
+        if not self.busy:
+            raise SystemExit(0)
+
+# small synthetic clock used to exercise every OpenCV call once before serving
+def _warmupimage():
+    img = np.full((240, 240), 255, dtype=np.uint8)
+    cv2.circle(img, (120, 120), 100, 0, 3)
+    cv2.line(img, (120, 120), (120, 45), 0, 4)
+    cv2.line(img, (120, 120), (175, 120), 0, 6)
+    return img
+
+# (image, reduction it was decoded at) of a request without a file to decode, see decode.py
+def _readimage(request, target=None):
+    if "filename" in request:
+        return frames.mapnpy(request["filename"]), 1
+
+    if "image" in request:
+        img, factor = decode.decodeimage(base64.b64decode(request["image"]), target)
+        if img is None:
+            raise ValueError("could not decode image bytes")
+        return img, factor
+
+    if "raw" in request:
+        if "shape" not in request:
+            raise ValueError("a 'raw' request needs the 'shape' of the frame")
+        return frames.mapraw(request["raw"], request["shape"], request.get("dtype", "uint8"), request.get("offset", 0)), 1
+
+    raise ValueError("request needs a 'filename', 'image', 'raw' or 'shm' field")
+
+# options are keyword arguments of processImage, a request may override the threshold and engine and
+# name the camera it comes from, whose clocks are then read where the registry of options stored them.
+# A debugsink sink under "debug" collects the stage images of the requests it samples, "target"
+# and "refine" are the decode options of processFile
+def detect(request, options=None, metrics=None):
+    options = dict(options or {})
+    debug = options.pop("debug", False)
+    target = options.pop("target", None)
+    refine = options.pop("refine", None)
+    for name in ("threshold", "engine", "camera"):
+        if name in request:
+            options[name] = request[name]
+    options.setdefault("threshold", None)
+    # frames in shared memory are read in place, the block is let go once detection is done
+    if "shm" in request:
+        if "shape" not in request:
+            raise ValueError("a 'shm' request needs the 'shape' of the frame")
+        with frames.sharedframe(request["shm"], request["shape"], request.get("dtype", "uint8")) as frame:
+            return processImage(frame.array, debug, metrics=metrics, **options)
+    if "filename" in request and not request["filename"].lower().endswith(".npy"):
+        results = processFile(request["filename"], debug, target, refine, metrics=metrics, **options)
+        if results is None:
+            raise ValueError("could not read image file %s" % request["filename"])
+        return results
+    img, factor = _readimage(request, target)
+    return [result.scale(factor) for result in processImage(img, debug, metrics=metrics, **options)]
+
+# a request with "metrics": true also gets the stage timers and counts of its detection
+def handlerequest(request, options=None):
+    response = {"id": request.get("id")}
+    metrics = stagemetrics() if request.get("metrics") else None
+    try:
+        response["clocks"] = [result.todict() for result in detect(request, options, metrics)]
+        response["error"] = None
+        if metrics is not None:
+            response["metrics"] = metrics.todict()
+    except Exception as e:
+        response["clocks"] = []
+        response["error"] = str(e)
+    return response
+
+def _handleline(line, options, stop=None):
+    # returns (response, keep running)
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return ({"id": None, "clocks": [], "error": "invalid request: %s" % e}, True)
+
+    if not isinstance(request, dict):
+        return ({"id": None, "clocks": [], "error": "invalid request: expected an object"}, True)
+
+    command = request.get("command")
+    if command == SHUTDOWN:
+        return ({"id": request.get("id"), "status": SHUTDOWN}, False)
+    if command == PING:
+        response = {"id": request.get("id"), "status": "ready"}
+        if options and options.get("cache") is not None:
+            response["cache"] = options["cache"].stats()
+        if options and options.get("registry") is not None:
+            response["registry"] = options["registry"].stats()
+        return (response, True)
+
+    if stop is None:
+        return (handlerequest(request, options), True)
+
+    stop.busy = True
+    try:
+        return (handlerequest(request, options), not stop.stopped)
+    finally:
+        stop.busy = False
+
+def _writeline(stream, response):
+    stream.write(json.dumps(response) + "\n")
+    stream.flush()
+
+# options that keep state across requests stay out of the warm-up, its synthetic clock must not
+# become the stored clocks of a camera, a cached result or the first sampled debug request
+WARMUP_EXCLUDED = ("registry", "camera", "cache", "debug")
+
+def runwarmup(options=None):
+    image = base64.b64encode(cv2.imencode(".png", _warmupimage())[1]).decode("ascii")
+    options = dict((name, value) for name, value in (options or {}).items() if name not in WARMUP_EXCLUDED)
+    response = handlerequest({"id": "warmup", "image": image}, options)
+    if response["error"] is not None:
+        sys.stderr.write("Warm-up failed: %s\n" % response["error"])
+
+def servestream(instream, outstream, options=None, stop=None):
+    for line in iter(instream.readline, ""):
+        if not line.strip():
+            continue
+        response, running = _handleline(line, options, stop)
+        _writeline(outstream, response)
+        if not running:
+            return False
+    return True
+
+def servesocket(path, options=None, stop=None):
+    class handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = (line.decode("utf-8") for line in self.rfile)
+            for line in reader:
+                if not line.strip():
+                    continue
+                response, running = _handleline(line, options, stop)
+                self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                if not running:
+                    # shutdown() blocks until serve_forever returns, so it cannot run on this thread
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.UnixStreamServer(path, handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+def serve(options=None, socketpath=None, warmup=True):
+    stop = _stopflag()
+    signal.signal(signal.SIGTERM, stop.set)
+
+    if warmup:
+        runwarmup(options)
+
+    if socketpath is None:
+        _writeline(sys.stdout, {"id": None, "status": "ready"})
+        servestream(sys.stdin, sys.stdout, options, stop)
+    else:
+        sys.stderr.write("Listening on %s\n" % socketpath)
+        servesocket(socketpath, options, stop)